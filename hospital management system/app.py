@@ -1,14 +1,59 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import sqlite3
 import os
+import click
 from functools import wraps
+from utils import init_app as init_db_pool, connect, get_db_connection
+from migrations import migrate, current_version, latest_version
+from stats import check_counters
+from imports import read_rows, file_format, import_users, ImportFileError
+from archive import archive_before, ARCHIVE_BATCH_SIZE
+from expiry import expire_before, expiry_cutoff, EXPIRY_BATCH_SIZE
+import expiry
+import writer
+from metrics import init_app as init_metrics
+import slowlog
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'hospital-management-system-secret-key-2025'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
+app.config['DATABASE'] = os.environ.get('HMS_DATABASE', 'hospital.db')
+app.config['DB_POOL_SIZE'] = 8
+# Read-only connections for GET requests, sized separately (0 sends GETs to the pool above)
+app.config['DB_READ_POOL_SIZE'] = int(os.environ.get('HMS_DB_READ_POOL_SIZE', 8))
+app.config['DB_POOL_TIMEOUT'] = 10.0
+app.config['SLOT_MINUTES'] = 30
+# 'auto': create/seed the database at startup only when its version stamp is stale
+# 'off': never touch the schema at startup, use `flask db init` / `flask db seed`
+app.config['DB_STARTUP'] = os.environ.get('HMS_DB_STARTUP', 'auto')
+# Log statements slower than this many milliseconds to SLOW_QUERY_LOG (off when unset)
+app.config['SLOW_QUERY_MS'] = float(os.environ['HMS_SLOW_QUERY_MS']) if os.environ.get('HMS_SLOW_QUERY_MS') else None
+app.config['SLOW_QUERY_LOG'] = os.environ.get('HMS_SLOW_QUERY_LOG', 'slow_queries.jsonl')
+# Archive file ATTACHed to every pooled connection (off when unset); `flask db archive`
+# moves finished appointments older than ARCHIVE_HORIZON_DAYS into it
+app.config['ARCHIVE_DATABASE'] = os.environ.get('HMS_ARCHIVE_DATABASE') or None
+app.config['ARCHIVE_HORIZON_DAYS'] = int(os.environ.get('HMS_ARCHIVE_HORIZON_DAYS', 365))
+# Booked appointments more than EXPIRE_AFTER_DAYS in the past become 'Expired', via
+# `flask db expire-bookings` or a timer thread every EXPIRE_INTERVAL_SECONDS (off when unset)
+app.config['EXPIRE_AFTER_DAYS'] = int(os.environ.get('HMS_EXPIRE_AFTER_DAYS', 0))
+app.config['EXPIRE_INTERVAL_SECONDS'] = float(os.environ['HMS_EXPIRE_INTERVAL']) if os.environ.get('HMS_EXPIRE_INTERVAL') else None
+
+# Route writes go through one writer thread with group commit (see writer.py);
+# HMS_WRITE_QUEUE=0 runs each write in its own transaction on the request's connection
+app.config['WRITE_QUEUE'] = os.environ.get('HMS_WRITE_QUEUE', '1') != '0'
+app.config['WRITE_BATCH_WINDOW_MS'] = float(os.environ.get('HMS_WRITE_BATCH_WINDOW_MS', 2))
+
+# Per-request pooled SQLite connections
+init_db_pool(app)
+writer.init_app(app)
+
+# Per-endpoint latency and SQL metrics, served at /admin/metrics
+init_metrics(app)
+slowlog.init_app(app)
+expiry.init_app(app)
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -16,9 +61,11 @@ login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 
+# Bump when the default admin account or department list changes
+SEED_VERSION = 1
+
 # Database initialization
-def init_db():
-    conn = sqlite3.connect('hospital.db')
+def create_schema(conn):
     cursor = conn.cursor()
     
     # Users table
@@ -121,14 +168,30 @@ def init_db():
         )
     ''')
     
+    # Key/value stamps (seed version)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    
     conn.commit()
     
-    # Create default admin user
-    admin_password = generate_password_hash('admin123')
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (username, password, role, fullname, email)
-        VALUES (?, ?, ?, ?, ?)
-    ''', ('admin', admin_password, 'admin', 'Hospital Admin', 'admin@hospital.com'))
+    # Indexes and later schema changes
+    migrate(conn)
+
+def seed_db(conn):
+    cursor = conn.cursor()
+    
+    # Create default admin user (password hashing is slow, so only when missing)
+    cursor.execute('SELECT id FROM users WHERE username = ?', ('admin',))
+    if not cursor.fetchone():
+        admin_password = generate_password_hash('admin123')
+        cursor.execute('''
+            INSERT OR IGNORE INTO users (username, password, role, fullname, email)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ('admin', admin_password, 'admin', 'Hospital Admin', 'admin@hospital.com'))
     
     # Create default departments (Comprehensive hospital departments)
     departments = [
@@ -180,24 +243,160 @@ def init_db():
         VALUES (?, ?)
     ''', departments)
     
+    cursor.execute('''
+        INSERT OR REPLACE INTO app_meta (key, value) VALUES ('seed_version', ?)
+    ''', (str(SEED_VERSION),))
+    
     conn.commit()
+
+def db_is_current(conn):
+    if current_version(conn) < latest_version():
+        return False
+    try:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'seed_version'").fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return row is not None and int(row[0]) >= SEED_VERSION
+
+def init_db(force=False):
+    conn = connect(app.config['DATABASE'])
+    try:
+        if force or not db_is_current(conn):
+            create_schema(conn)
+            seed_db(conn)
+    finally:
+        conn.close()
+
+# Initialize database on startup (a cheap version check once it is current)
+if app.config['DB_STARTUP'] == 'auto':
+    init_db()
+
+@app.cli.group('db')
+def db_cli():
+    """Database management commands."""
+
+@db_cli.command('init')
+def db_init_command():
+    """Create tables and apply pending migrations."""
+    conn = connect(app.config['DATABASE'])
+    create_schema(conn)
+    click.echo(f'Schema at version {current_version(conn)}.')
+    conn.close()
+
+@db_cli.command('seed')
+def db_seed_command():
+    """Insert the default admin account and departments."""
+    conn = connect(app.config['DATABASE'])
+    seed_db(conn)
+    click.echo(f'Seed data at version {SEED_VERSION}.')
+    conn.close()
+
+@db_cli.command('check-counters')
+@click.option('--fix', is_flag=True, help='Overwrite drifted counters with recomputed values.')
+def db_check_counters_command(fix):
+    """Recompute dashboard counters and report drift."""
+    conn = connect(app.config['DATABASE'])
+    drift = check_counters(conn, fix=fix)
+    conn.close()
+    for name, stored, actual in drift:
+        click.echo(f'{name}: stored {stored}, actual {actual}')
+    if not drift:
+        click.echo('All counters consistent.')
+    elif fix:
+        click.echo(f'Fixed {len(drift)} counter(s).')
+    else:
+        raise SystemExit(1)
+
+@db_cli.command('slow-queries')
+@click.option('--file', 'path', help='Log file (default: SLOW_QUERY_LOG).')
+@click.option('--top', default=20, show_default=True, help='Number of statements to show.')
+def db_slow_queries_command(path, top):
+    """Summarize the slow-query log by statement, slowest total time first."""
+    groups = slowlog.summarize(slowlog.read_entries(path or app.config['SLOW_QUERY_LOG']))
+    if not groups:
+        click.echo('No slow queries logged.')
+        return
+    for group in groups[:top]:
+        click.echo(f"{group['total_ms']:10.1f} ms total  {group['count']:6d}x  max {group['max_ms']:.1f} ms  "
+                   f"routes: {', '.join(sorted(group['routes']))}")
+        click.echo(f"    {group['sql'][:200]}")
+        for step in group['scans']:
+            click.echo(f'    SCAN: {step}')
+
+@db_cli.command('import-users')
+@click.argument('role', type=click.Choice(['doctor', 'patient']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='File format (default: from the extension).')
+@click.option('--workers', type=int, help='Password hashing threads (default: one per CPU).')
+@click.option('--dry-run', is_flag=True, help='Validate and report without creating accounts.')
+def db_import_users_command(role, path, fmt, workers, dry_run):
+    """Create doctor or patient accounts from a CSV or JSON file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        rows = read_rows(data, fmt or file_format(path))
+    except ImportFileError as e:
+        raise click.ClickException(str(e))
+    conn = connect(app.config['DATABASE'])
+    result = import_users(conn, role, rows, workers=workers, dry_run=dry_run)
+    conn.close()
+    for number, message in result['errors']:
+        click.echo(f'row {number}: {message}')
+    verb = 'Would import' if dry_run else 'Imported'
+    click.echo(f"{verb} {result['valid']} of {result['total']} {role}(s); {len(result['errors'])} rejected.")
+    if result['errors']:
+        raise SystemExit(1)
+
+@db_cli.command('archive')
+@click.option('--days', type=int, help='Archive finished appointments older than this (default: ARCHIVE_HORIZON_DAYS).')
+@click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True, help='Appointments moved per transaction.')
+def db_archive_command(days, batch_size):
+    """Move old Completed/Cancelled/Expired appointments and their treatments to the archive file."""
+    if not app.config['ARCHIVE_DATABASE']:
+        raise click.ClickException('Set HMS_ARCHIVE_DATABASE to the archive file first.')
+    days = app.config['ARCHIVE_HORIZON_DAYS'] if days is None else days
+    cutoff = date.today() - timedelta(days=days)
+    conn = connect(app.config['DATABASE'], archive_database=app.config['ARCHIVE_DATABASE'])
+    totals = archive_before(conn, cutoff, batch_size)
     conn.close()
+    click.echo(f"Archived {totals['appointments']} appointment(s) and {totals['treatments']} treatment(s) "
+               f"dated before {cutoff} in {totals['batches']} batch(es), {totals['seconds']}s.")
 
-# Initialize database on startup
-init_db()
+@db_cli.command('expire-bookings')
+@click.option('--days', type=int, help='Grace period after the appointment date (default: EXPIRE_AFTER_DAYS).')
+@click.option('--batch-size', default=EXPIRY_BATCH_SIZE, show_default=True, help='Appointments updated per transaction.')
+def db_expire_bookings_command(days, batch_size):
+    """Mark past-dated Booked appointments as Expired."""
+    cutoff = expiry_cutoff(app.config['EXPIRE_AFTER_DAYS'] if days is None else days)
+    conn = connect(app.config['DATABASE'])
+    totals = expire_before(conn, cutoff, batch_size)
+    conn.close()
+    click.echo(f"Expired {totals['appointments']} booked appointment(s) dated before {cutoff} "
+               f"in {totals['batches']} batch(es), {totals['seconds']}s.")
 
-from models import User
+from models import User, USER_COLUMNS, USER_JOINS, user_cache, users_version
 
 @login_manager.user_loader
 def load_user(user_id):
-    conn = sqlite3.connect('hospital.db')
+    conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT id, username, role, fullname FROM users WHERE id = ? AND is_blacklisted = 0', (user_id,))
+    
+    # The stamp is read before the row: a concurrent change then only costs a reload
+    version = users_version.get(cursor)
+    entry = user_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    
+    cursor.execute(f'''
+        SELECT {USER_COLUMNS} {USER_JOINS}
+        WHERE u.id = ? AND u.is_blacklisted = 0
+    ''', (user_id,))
     user_data = cursor.fetchone()
-    conn.close()
     
     if user_data:
-        return User(user_data[0], user_data[1], user_data[2], user_data[3])
+        user = User.from_row(user_data)
+        user_cache.set(user_id, (version, user))
+        return user
     return None
 
 
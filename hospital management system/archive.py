@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+
+# Cold storage for old appointments. `flask db archive` moves Completed,
+# Cancelled and Expired appointments older than ARCHIVE_HORIZON_DAYS, with their
+# treatments, into a separate SQLite file that every pooled connection
+# ATTACHes as `archive`. The hot tables keep only recent history; the
+# history views reach into the archive through the history_summary view
+# only once a patient pages past their hot rows.
+ARCHIVED_STATUSES = ('Completed', 'Cancelled', 'Expired')
+ARCHIVE_BATCH_SIZE = 5000
+
+ARCHIVE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archive.appointments (
+        id INTEGER PRIMARY KEY,
+        patient_id INTEGER NOT NULL,
+        doctor_id INTEGER NOT NULL,
+        appointment_date DATE NOT NULL,
+        appointment_time TEXT NOT NULL,
+        status TEXT,
+        notes TEXT,
+        created_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS archive.treatments (
+        id INTEGER PRIMARY KEY,
+        appointment_id INTEGER NOT NULL,
+        visit_type TEXT,
+        tests_done TEXT,
+        diagnosis TEXT,
+        prescription TEXT,
+        medicines TEXT,
+        notes TEXT,
+        created_at TIMESTAMP
+    );
+    -- Same shapes as the hot history indexes (migration 8)
+    CREATE INDEX IF NOT EXISTS archive.idx_appointments_patient_date
+        ON appointments (patient_id, appointment_date, doctor_id);
+    CREATE INDEX IF NOT EXISTS archive.idx_treatments_summary
+        ON treatments (appointment_id, created_at, visit_type);
+'''
+
+# Temp views may span attached databases; each connection creates its own.
+# Archived copies of rows that are still hot (see archive_before) are skipped.
+HISTORY_VIEW = '''
+    CREATE TEMP VIEW IF NOT EXISTS history_summary AS
+        SELECT t.id, t.created_at, t.visit_type, a.appointment_date, a.patient_id, a.doctor_id
+        FROM main.appointments a JOIN main.treatments t ON t.appointment_id = a.id
+        UNION ALL
+        SELECT t.id, t.created_at, t.visit_type, a.appointment_date, a.patient_id, a.doctor_id
+        FROM archive.appointments a JOIN archive.treatments t ON t.appointment_id = a.id
+        WHERE NOT EXISTS (SELECT 1 FROM main.appointments h WHERE h.id = a.id)
+'''
+
+# Every appointment, hot or archived, for rebuilding the doctor_patients roster
+ALL_APPOINTMENTS = '''(
+    SELECT doctor_id, patient_id, appointment_date FROM main.appointments
+    UNION ALL
+    SELECT doctor_id, patient_id, appointment_date FROM archive.appointments x
+    WHERE NOT EXISTS (SELECT 1 FROM main.appointments h WHERE h.id = x.id)
+)'''
+
+# The roster delete trigger recounts a pair from the hot table alone; put the
+# archived visits of the pairs just moved back in
+ROSTER_PAIRS = '''
+    SELECT DISTINCT doctor_id, patient_id FROM archive.appointments WHERE id IN (SELECT value FROM json_each(?))
+'''
+ROSTER_REFRESH_SQL = (
+    f'DELETE FROM main.doctor_patients WHERE (doctor_id, patient_id) IN ({ROSTER_PAIRS})',
+    f'''INSERT INTO main.doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+        SELECT doctor_id, patient_id, MIN(appointment_date), MAX(appointment_date), COUNT(*)
+        FROM {ALL_APPOINTMENTS}
+        WHERE (doctor_id, patient_id) IN ({ROSTER_PAIRS})
+        GROUP BY doctor_id, patient_id''',
+)
+
+APPOINTMENT_COLUMNS = ('id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'status',
+                       'notes', 'created_at')
+TREATMENT_COLUMNS = ('id', 'appointment_id', 'visit_type', 'tests_done', 'diagnosis', 'prescription',
+                     'medicines', 'notes', 'created_at')
+
+
+def same_row(columns, left, right):
+    # IS compares NULLs as equal
+    return ' AND '.join(f'{right}.{column} IS {left}.{column}' for column in columns)
+
+
+# Appointments in the batch whose archived copy, and every treatment's, is identical to the hot row
+VERIFIED_SQL = f'''
+    SELECT a.id, a.appointment_date FROM main.appointments a
+    JOIN archive.appointments x ON x.id = a.id
+    WHERE a.id IN (SELECT value FROM json_each(?)) AND {same_row(APPOINTMENT_COLUMNS, 'a', 'x')}
+    AND NOT EXISTS (
+        SELECT 1 FROM main.treatments t
+        WHERE t.appointment_id = a.id AND NOT EXISTS (
+            SELECT 1 FROM archive.treatments y WHERE y.id = t.id AND {same_row(TREATMENT_COLUMNS, 't', 'y')}
+        )
+    )
+'''
+
+
+def create_schema(conn):
+    conn.execute('PRAGMA archive.journal_mode = WAL')
+    conn.executescript(ARCHIVE_SCHEMA)
+
+
+def attach(conn, path, readonly=False):
+    """ATTACH the archive file as `archive`, creating its schema if needed.
+
+    A readonly attach needs a connection opened with uri=True.
+    """
+    if readonly:
+        if not os.path.exists(path):
+            init = sqlite3.connect(':memory:')
+            init.execute('ATTACH DATABASE ? AS archive', (path,))
+            create_schema(init)
+            init.close()
+        conn.execute('ATTACH DATABASE ? AS archive', (f'file:{quote(os.path.abspath(path))}?mode=ro',))
+    else:
+        conn.execute('ATTACH DATABASE ? AS archive', (path,))
+        create_schema(conn)
+    conn.execute(HISTORY_VIEW)
+
+
+def is_attached(conn):
+    return any(row[1] == 'archive' for row in conn.execute('PRAGMA database_list'))
+
+
+def archived_through(cursor):
+    """Latest appointment date moved to the archive, or None if nothing was."""
+    cursor.execute("SELECT value FROM app_meta WHERE key = 'archived_through'")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def archive_before(conn, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move archivable appointments dated before cutoff, batch_size at a time.
+
+    Returns {'appointments', 'treatments', 'batches', 'seconds'}. A commit
+    spanning two WAL databases is not atomic across them, so each batch is
+    copied in one transaction and deleted in a second that only removes
+    rows whose archived copy matches. A crash or a concurrent edit between
+    the two leaves rows hot (and the view hides their copies); the next run
+    refreshes the copies and finishes the move.
+    """
+    started = time.perf_counter()
+    totals = {'appointments': 0, 'treatments': 0, 'batches': 0}
+    statuses = json.dumps(ARCHIVED_STATUSES)
+    appointment_columns = ', '.join(APPOINTMENT_COLUMNS)
+    treatment_columns = ', '.join(TREATMENT_COLUMNS)
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+
+    while True:
+        # 1. Copy: writes only the archive file
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                SELECT id FROM main.appointments
+                WHERE status IN (SELECT value FROM json_each(?)) AND appointment_date < ?
+                LIMIT ?
+            ''', (statuses, cutoff.isoformat(), batch_size))
+            ids = json.dumps([row[0] for row in cursor.fetchall()])
+            if ids == '[]':
+                conn.rollback()
+                break
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO archive.appointments ({appointment_columns})
+                SELECT {appointment_columns} FROM main.appointments WHERE id IN (SELECT value FROM json_each(?))
+            ''', (ids,))
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO archive.treatments ({treatment_columns})
+                SELECT {treatment_columns} FROM main.treatments
+                WHERE appointment_id IN (SELECT value FROM json_each(?))
+            ''', (ids,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # 2. Delete: writes only the main file
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(VERIFIED_SQL, (ids,))
+            verified = cursor.fetchall()
+            moved = json.dumps([row[0] for row in verified])
+            cursor.execute('DELETE FROM main.treatments WHERE appointment_id IN (SELECT value FROM json_each(?))',
+                           (moved,))
+            treatments = cursor.rowcount
+            cursor.execute('DELETE FROM main.appointments WHERE id IN (SELECT value FROM json_each(?))', (moved,))
+            # Same transaction: the roster keeps counting archived visits
+            for sql in ROSTER_REFRESH_SQL:
+                cursor.execute(sql, (moved,))
+            if verified:
+                cursor.execute('''
+                    INSERT INTO app_meta (key, value) VALUES ('archived_through', ?)
+                    ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+                ''', (max(row[1] for row in verified),))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        totals['appointments'] += len(verified)
+        totals['treatments'] += treatments
+        totals['batches'] += 1
+        if not verified:
+            # Every row in the batch changed under us; leave them for the next run
+            break
+
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    return totals
@@ -0,0 +1,75 @@
+"""Admin dashboard latency and memory at growing table sizes.
+
+Seeds a fresh database per size and times GET /admin/dashboard through the
+Flask test client. With keyset pagination the numbers should stay flat.
+
+    python bench/admin_dashboard.py --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(size, requests):
+    import dataset
+    from app import app
+    conn = app.extensions['db_pool'].acquire()
+    dataset.generate(conn, doctors=max(size // 2000, 1), patients=max(size // 5, 1), appointments=size)
+    app.extensions['db_pool'].release(conn)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123', 'user_type': 'staff'})
+    client.get('/admin/dashboard')  # warm the page cache
+    timings = []
+    tracemalloc.start()
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get('/admin/dashboard')
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'appointments': size,
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'peak_alloc_kb': peak // 1024,
+        'response_kb': len(response.data) // 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.requests)))
+        return 0
+
+    # Each size runs in its own process so the app binds to a fresh database
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HMS_DATABASE=os.path.join(tmp, 'hospital.db'))
+            out = subprocess.run([sys.executable, __file__, '--child', str(size), '--requests', str(args.requests)],
+                                 cwd=APP_DIR, env=env, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, APP_DIR)
+    sys.exit(main())
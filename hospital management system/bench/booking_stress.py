@@ -0,0 +1,122 @@
+"""Concurrent booking stress test for patient.check_availability.
+
+Many threads, each logged in as its own patient, race to book the same
+doctors' slots. Fails if any slot ends up booked twice. Run it with
+HMS_WRITE_QUEUE=0 to compare against per-request write transactions.
+
+    python bench/booking_stress.py --threads 64 --attempts 50 --doctors 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# 30-minute slots inside the 09:00-12:00 and 14:00-18:00 windows seeded below
+SLOT_TIMES = [f'{hour:02d}:{minute:02d}' for hour in (9, 10, 11, 14, 15, 16, 17) for minute in (0, 30)]
+
+
+def seed(conn, doctors, patients):
+    from werkzeug.security import generate_password_hash
+    password = generate_password_hash('bench')
+    today = date.today()
+    with conn:
+        for i in range(doctors):
+            user_id = conn.execute('INSERT INTO users (username, password, role, fullname) VALUES (?, ?, ?, ?)',
+                                   (f'stress_doctor{i}', password, 'doctor', f'Doctor {i}')).lastrowid
+            doctor_id = conn.execute('INSERT INTO doctors (user_id, specialization, department_id) VALUES (?, ?, ?)',
+                                     (user_id, 'General', 1)).lastrowid
+            conn.executemany('INSERT INTO doctor_availability (doctor_id, date, morning_start, morning_end, evening_start, evening_end) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             ((doctor_id, today + timedelta(days=d), '09:00', '12:00', '14:00', '18:00') for d in range(7)))
+        for i in range(patients):
+            user_id = conn.execute('INSERT INTO users (username, password, role, fullname) VALUES (?, ?, ?, ?)',
+                                   (f'stress_patient{i}', password, 'patient', f'Patient {i}')).lastrowid
+            conn.execute('INSERT INTO patients (user_id) VALUES (?)', (user_id,))
+
+
+def worker(app, index, attempts, doctor_ids, results, barrier):
+    rng = random.Random(index)
+    client = app.test_client()
+    client.post('/login', data={'username': f'stress_patient{index}', 'password': 'bench', 'user_type': 'patient'})
+    today = date.today()
+    booked = conflicts = errors = 0
+    barrier.wait()
+    for _ in range(attempts):
+        doctor_id = rng.choice(doctor_ids)
+        day = (today + timedelta(days=rng.randint(1, 6))).isoformat()
+        response = client.post(f'/patient/doctor/{doctor_id}/availability',
+                               data={'appointment_date': day, 'appointment_time': rng.choice(SLOT_TIMES)})
+        if response.status_code == 302:
+            booked += 1
+        elif b'already booked' in response.data:
+            conflicts += 1
+        else:
+            errors += 1
+    results[index] = (booked, conflicts, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--attempts', type=int, default=50, help='bookings attempted per thread')
+    parser.add_argument('--doctors', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        from app import app
+        from utils import connect
+
+        conn = connect(app.config['DATABASE'])
+        seed(conn, args.doctors, args.threads)
+        doctor_ids = [row[0] for row in conn.execute('SELECT id FROM doctors')]
+
+        results = [None] * args.threads
+        barrier = threading.Barrier(args.threads + 1)
+        threads = [threading.Thread(target=worker, args=(app, i, args.attempts, doctor_ids, results, barrier))
+                   for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        double_booked = conn.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM appointments WHERE status = 'Booked'
+                GROUP BY doctor_id, appointment_date, appointment_time HAVING COUNT(*) > 1
+            )
+        ''').fetchone()[0]
+        stored = conn.execute("SELECT COUNT(*) FROM appointments WHERE status = 'Booked'").fetchone()[0]
+        conn.close()
+
+    booked = sum(r[0] for r in results)
+    report = {
+        'attempts': args.threads * args.attempts,
+        'booked': booked,
+        'conflicts': sum(r[1] for r in results),
+        'errors': sum(r[2] for r in results),
+        'stored_bookings': stored,
+        'double_booked_slots': double_booked,
+        'seconds': round(elapsed, 2),
+        'attempts_per_second': round(args.threads * args.attempts / elapsed, 1),
+        'bookings_per_second': round(booked / elapsed, 1),
+        'pool': app.extensions['db_pool'].stats(),
+        'writer': app.extensions['db_writer'].stats() if 'db_writer' in app.extensions else None,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if double_booked == 0 and stored == booked and report['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
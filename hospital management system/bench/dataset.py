@@ -0,0 +1,208 @@
+"""Deterministic synthetic hospital dataset for the benchmarks.
+
+Adds departments, doctors, patients, several years of appointments,
+treatments and availability rows to a database that already has the app's
+schema and seed data. The same arguments always produce the same rows.
+Every generated user can log in with the password 'bench' (usernames
+doctor<N> and patient<N>).
+
+    python bench/dataset.py --out /tmp/hospital.db --appointments 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'bench'
+
+FIRST_NAMES = ('Aarav', 'Priya', 'John', 'Sarah', 'Rajesh', 'Anjali', 'David', 'Michael', 'Meera', 'Arjun')
+LAST_NAMES = ('Kumar', 'Sharma', 'Smith', 'Johnson', 'Patel', 'Williams', 'Chen', 'Reddy', 'Iyer', 'Das')
+SPECIALIZATIONS = ('Cardiology', 'Neurology', 'Oncology', 'Orthopedics', 'Pediatrics', 'General Medicine')
+DIAGNOSES = ('Hypertension', 'Migraine', 'Type 2 diabetes', 'Fracture', 'Viral fever', 'Asthma')
+
+# 30-minute slots inside the 09:00-12:00 and 14:00-18:00 availability windows
+SLOT_TIMES = [f'{hour:02d}:{minute:02d}' for hour in (9, 10, 11, 14, 15, 16, 17) for minute in (0, 30)]
+
+DEFAULTS = {
+    'departments': 42,
+    'doctors': 200,
+    'patients': 20000,
+    'appointments': 200000,
+    'years': 3,
+    'treatments': 0.7,
+    'availability_days': 14,
+    'booked': 0.05,
+    'blacklisted': 0.0,
+}
+
+
+@contextmanager
+def deferred_indexes(conn, tables):
+    """Drop the indexes and triggers on tables for a bulk load, then recreate them.
+
+    Building an index once over sorted data is far cheaper than updating it
+    per row. Trigger-maintained counters and the doctor roster are
+    recomputed afterwards.
+    """
+    from stats import check_counters, rebuild_roster
+
+    placeholders = ', '.join('?' for _ in tables)
+    objects = conn.execute(f'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    ''', list(tables)).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} {name}')
+    yield
+    for _, _, sql in objects:
+        conn.execute(sql)
+    check_counters(conn, fix=True)
+    if 'appointments' in tables:
+        rebuild_roster(conn)
+
+
+def generate(conn, seed=42, departments=42, doctors=200, patients=20000, appointments=200000,
+             years=3, treatments=0.7, availability_days=14, booked=0.05, blacklisted=0.0, today=None):
+    """Insert the dataset in one transaction and return the row counts.
+
+    departments is the total wanted (the app seeds 42). treatments is the
+    share of completed appointments with a treatment record, booked the
+    share of appointments that are upcoming 'Booked' slots, and blacklisted
+    the share of blacklisted users.
+    """
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    today = today or date.today()
+    password = generate_password_hash(PASSWORD)
+
+    def next_id(table):
+        return conn.execute(f'SELECT IFNULL(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+
+    def person():
+        return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+    with conn:
+        first_department = next_id('departments')
+        conn.executemany('INSERT INTO departments (id, name, description) VALUES (?, ?, ?)',
+                         ((first_department + i, f'Department {first_department + i}', 'Synthetic department')
+                          for i in range(max(departments - first_department + 1, 0))))
+        department_ids = [row[0] for row in conn.execute('SELECT id FROM departments')]
+
+        first_user = next_id('users')
+        first_doctor = next_id('doctors')
+        conn.executemany('INSERT INTO users (id, username, password, role, fullname, email, phone, is_blacklisted) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         ((first_user + i, f'doctor{i}', password, 'doctor', f'Dr. {person()}',
+                           f'doctor{i}@bench.test', f'97{i:08d}', int(rng.random() < blacklisted))
+                          for i in range(doctors)))
+        conn.executemany('INSERT INTO doctors (id, user_id, specialization, department_id, experience_years, qualification) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         ((first_doctor + i, first_user + i, rng.choice(SPECIALIZATIONS),
+                           department_ids[i % len(department_ids)], rng.randint(1, 35), 'MBBS, MD')
+                          for i in range(doctors)))
+
+        first_user += doctors
+        first_patient = next_id('patients')
+        conn.executemany('INSERT INTO users (id, username, password, role, fullname, email, phone, is_blacklisted) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         ((first_user + i, f'patient{i}', password, 'patient', person(),
+                           f'patient{i}@bench.test', f'98{i:08d}', int(rng.random() < blacklisted))
+                          for i in range(patients)))
+        conn.executemany('INSERT INTO patients (id, user_id, age, gender, blood_group) VALUES (?, ?, ?, ?, ?)',
+                         ((first_patient + i, first_user + i, rng.randint(1, 90), rng.choice(('Male', 'Female')),
+                           rng.choice(('A+', 'B+', 'O+', 'AB+', 'O-'))) for i in range(patients)))
+
+        conn.executemany('INSERT INTO doctor_availability (doctor_id, date, morning_start, morning_end, evening_start, evening_end) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         ((first_doctor + i, (today + timedelta(days=d)).isoformat(), '09:00', '12:00', '14:00', '18:00')
+                          for i in range(doctors) for d in range(-availability_days, availability_days)))
+
+        # Upcoming bookings take distinct (doctor, day, slot) triples; the rest is history
+        capacity = doctors * availability_days * len(SLOT_TIMES)
+        upcoming = min(int(appointments * booked), capacity) if doctors and patients else 0
+        past = appointments - upcoming if doctors and patients else 0
+        first_appointment = next_id('appointments')
+
+        # Plain rng.random() arithmetic and precomputed date strings keep row generation cheap
+        rand = rng.random
+        days_back = [(today - timedelta(days=d)).isoformat() for d in range(years * 365 + 32)]
+        days_ahead = [(today + timedelta(days=d)).isoformat() for d in range(availability_days)]
+        completed = []
+
+        def appointment_rows():
+            for i in range(upcoming):
+                slot, doctor = divmod(i, doctors)
+                day, time_index = divmod(slot, len(SLOT_TIMES))
+                yield (first_appointment + i, first_patient + int(rand() * patients), first_doctor + doctor,
+                       days_ahead[day], SLOT_TIMES[time_index], 'Booked', days_back[int(rand() * 30)] + ' 10:00:00')
+            for i in range(upcoming, upcoming + past):
+                back = 1 + int(rand() * years * 365)
+                when = days_back[back]
+                at = SLOT_TIMES[int(rand() * len(SLOT_TIMES))]
+                status = 'Completed' if rand() < 0.7 else 'Cancelled'
+                if status == 'Completed' and rand() < treatments:
+                    completed.append((first_appointment + i, when, at))
+                yield (first_appointment + i, first_patient + int(rand() * patients), first_doctor + int(rand() * doctors),
+                       when, at, status, days_back[back + 1 + int(rand() * 30)] + ' 10:00:00')
+
+        with deferred_indexes(conn, ('appointments', 'treatments')):
+            conn.executemany('INSERT INTO appointments (id, patient_id, doctor_id, appointment_date, appointment_time, status, created_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?)', appointment_rows())
+            conn.executemany('INSERT INTO treatments (appointment_id, visit_type, diagnosis, prescription, medicines, created_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             ((appointment_id, rng.choice(('In-person', 'Follow-up')), rng.choice(DIAGNOSES),
+                               'Rest and review in two weeks', 'Paracetamol 500mg', f'{when} {at}:00')
+                              for appointment_id, when, at in completed))
+    conn.execute('ANALYZE')
+
+    return {
+        'departments': len(department_ids),
+        'doctors': doctors,
+        'patients': patients,
+        'appointments': upcoming + past,
+        'booked': upcoming,
+        'treatments': len(completed),
+        'availability': doctors * availability_days * 2,
+    }
+
+
+def add_arguments(parser):
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def sizes(args):
+    return {name: getattr(args, name) for name in DEFAULTS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', required=True, help='database file to create (must not exist)')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.out):
+        parser.error(f'{args.out} already exists')
+    os.environ['HMS_DATABASE'] = args.out
+    from app import app
+    from utils import connect
+
+    conn = connect(app.config['DATABASE'])
+    started = time.perf_counter()
+    counts = generate(conn, seed=args.seed, **sizes(args))
+    conn.close()
+    print(json.dumps(dict(counts, seconds=round(time.perf_counter() - started, 1)), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, APP_DIR)
+    sys.exit(main())
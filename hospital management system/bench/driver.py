@@ -0,0 +1,215 @@
+"""Route-level load test over a synthetic dataset, with a JSON baseline.
+
+Builds a dataset with bench/dataset.py (or reuses --db), logs in as admin,
+doctors and patients, and replays a workload against every blueprint
+through the Flask test client. Reports p50/p95/p99 latency, requests per
+second and SQL statements per request for each route.
+
+    python bench/driver.py --appointments 1000000 --out baseline.json
+    python bench/driver.py --appointments 1000000 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import dataset  # noqa: E402  (bench/ is on sys.path when run as a script)
+
+SEARCH_TERMS = ('kum', 'priya sharma', 'cardio', 'smith', 'pa', '98000')
+
+
+class Context:
+    """Ids the workloads pick from, read once from the generated database."""
+
+    def __init__(self, conn, rng):
+        self.rng = rng
+        self.doctors = [row[0] for row in conn.execute('SELECT id FROM doctors ORDER BY id')]
+        self.departments = [row[0] for row in conn.execute('SELECT id FROM departments ORDER BY id')]
+        self.appointments = [row[0] for row in conn.execute(
+            'SELECT id FROM appointments ORDER BY id LIMIT 10000')]
+        self.patients = [row[0] for row in conn.execute('SELECT id FROM patients ORDER BY id LIMIT 10000')]
+
+    def pick(self, values):
+        return values[self.rng.randrange(len(values))]
+
+    def day(self, start=1, end=6):
+        return (date.today() + timedelta(days=self.rng.randint(start, end))).isoformat()
+
+
+# name -> (role, request builder returning (method, url, form data))
+WORKLOADS = {
+    'public.index': (None, lambda ctx: ('GET', '/', None)),
+    'public.departments': (None, lambda ctx: ('GET', '/departments', None)),
+    'admin.dashboard': ('admin', lambda ctx: ('GET', '/admin/dashboard', None)),
+    'admin.dashboard_page': ('admin', lambda ctx: ('GET', '/admin/dashboard/past', None)),
+    'admin.search': ('admin', lambda ctx: ('GET', f'/admin/search?query={ctx.pick(SEARCH_TERMS)}', None)),
+    'admin.view_patient_history': ('admin', lambda ctx: (
+        'GET', f'/admin/appointment/{ctx.pick(ctx.appointments)}/history', None)),
+    'doctor.dashboard': ('doctor', lambda ctx: ('GET', '/doctor/dashboard', None)),
+    'doctor.availability': ('doctor', lambda ctx: ('GET', '/doctor/availability', None)),
+    'doctor.view_patient_history': ('doctor', lambda ctx: (
+        'GET', f'/doctor/patient/{ctx.pick(ctx.patients)}/history', None)),
+    'patient.dashboard': ('patient', lambda ctx: ('GET', '/patient/dashboard', None)),
+    'patient.view_department': ('patient', lambda ctx: (
+        'GET', f'/patient/department/{ctx.pick(ctx.departments)}', None)),
+    'patient.view_doctor': ('patient', lambda ctx: ('GET', f'/patient/doctor/{ctx.pick(ctx.doctors)}', None)),
+    'patient.check_availability': ('patient', lambda ctx: (
+        'GET', f'/patient/doctor/{ctx.pick(ctx.doctors)}/availability', None)),
+    'patient.doctor_slots': ('patient', lambda ctx: ('GET', f'/patient/doctor/{ctx.pick(ctx.doctors)}/slots', None)),
+    'patient.search': ('patient', lambda ctx: ('GET', f'/patient/search?query={ctx.pick(SEARCH_TERMS)}', None)),
+    'patient.history': ('patient', lambda ctx: ('GET', '/patient/history', None)),
+    'patient.book': ('patient', lambda ctx: (
+        'POST', f'/patient/doctor/{ctx.pick(ctx.doctors)}/availability',
+        {'appointment_date': ctx.day(), 'appointment_time': ctx.pick(dataset.SLOT_TIMES)})),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def login(app, role, index):
+    client = app.test_client()
+    if role is None:
+        return client
+    if role == 'admin':
+        data = {'username': 'admin', 'password': 'admin123', 'user_type': 'staff'}
+    else:
+        data = {'username': f'{role}{index}', 'password': dataset.PASSWORD,
+                'user_type': 'patient' if role == 'patient' else 'staff'}
+    response = client.post('/login', data=data)
+    if response.status_code != 302:
+        raise RuntimeError(f'login failed for {data["username"]}')
+    return client
+
+
+def total_statements():
+    # SQL accounting from the app's own per-request metrics (metrics.py)
+    import metrics
+    return sum(stats.statements_sum for stats in metrics.registry.snapshot().values())
+
+
+def run_workload(clients, build, ctx, requests):
+    timings = []
+    errors = 0
+    statements = total_statements()
+    started = time.perf_counter()
+    for i in range(requests):
+        method, url, data = build(ctx)
+        client = clients[i % len(clients)]
+        t0 = time.perf_counter()
+        response = client.open(url, method=method, data=data)
+        timings.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'rps': round(requests / elapsed, 1),
+        'queries_per_request': round((total_statements() - statements) / requests, 2),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Routes whose p95 latency or query count regressed against the baseline."""
+    regressions = []
+    for name, current in report['routes'].items():
+        previous = baseline.get('routes', {}).get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{name}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    dataset.add_arguments(parser)
+    parser.add_argument('--db', help='reuse a database built by bench/dataset.py (copied, never modified)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--clients', type=int, default=8, help='logged-in users per role')
+    parser.add_argument('--routes', help='comma-separated subset of: ' + ', '.join(WORKLOADS))
+    parser.add_argument('--out', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown for --compare')
+    args = parser.parse_args()
+
+    routes = args.routes.split(',') if args.routes else list(WORKLOADS)
+    unknown = set(routes) - set(WORKLOADS)
+    if unknown:
+        parser.error('unknown routes: ' + ', '.join(sorted(unknown)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'hospital.db')
+        if args.db:
+            shutil.copy(args.db, database)
+        os.environ['HMS_DATABASE'] = database
+
+        import utils
+        from app import app
+
+        conn = utils.connect(database)
+        started = time.perf_counter()
+        counts = dataset.generate(conn, seed=args.seed, **dataset.sizes(args)) if not args.db else None
+        build_seconds = round(time.perf_counter() - started, 1)
+        ctx = Context(conn, random.Random(args.seed))
+        conn.close()
+
+        clients = {}
+        results = {}
+        for name in routes:
+            role, build = WORKLOADS[name]
+            if role not in clients:
+                count = 1 if role in (None, 'admin') else args.clients
+                clients[role] = [login(app, role, i) for i in range(count)]
+            run_workload(clients[role], build, ctx, min(5, args.requests))  # warm up
+            results[name] = run_workload(clients[role], build, ctx, args.requests)
+            print(json.dumps({name: results[name]}), file=sys.stderr)
+
+    report = {
+        'meta': {
+            'dataset': counts or {'db': args.db},
+            'build_seconds': build_seconds,
+            'seed': args.seed,
+            'requests_per_route': args.requests,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'routes': results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Admin export throughput and memory on a synthetic dataset.
+
+Streams each export through the Flask test client, reading the body chunk
+by chunk like a slow client would, and reports rows per second and the
+process's peak RSS growth. Memory should stay flat as --appointments grows.
+
+    python bench/export.py --appointments 5000000
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import dataset  # noqa: E402  (bench/ is on sys.path when run as a script)
+
+
+def rss_mb():
+    # Current resident set size; ru_maxrss would still reflect the dataset build
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    dataset.add_arguments(parser)
+    parser.add_argument('--db', help='reuse a database built by bench/dataset.py')
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = args.db or os.path.join(tmp, 'hospital.db')
+        import utils
+        from app import app
+
+        if not args.db:
+            conn = utils.connect(app.config['DATABASE'])
+            dataset.generate(conn, seed=args.seed, **dataset.sizes(args))
+            conn.close()
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123', 'user_type': 'staff'})
+
+        report = {}
+        for name in ('appointments', 'treatments', 'doctors', 'patients'):
+            baseline = peak = rss_mb()
+            started = time.perf_counter()
+            response = client.get(f'/admin/export/{name}?format={args.format}', buffered=False)
+            lines = size = 0
+            for i, chunk in enumerate(response.response):
+                lines += chunk.count(b'\n')
+                size += len(chunk)
+                if i % 100 == 0:
+                    peak = max(peak, rss_mb())
+            response.close()
+            elapsed = time.perf_counter() - started
+            report[name] = {
+                'rows': lines - (args.format == 'csv'),
+                'megabytes': round(size / 1e6, 1),
+                'seconds': round(elapsed, 2),
+                'rows_per_second': round(lines / elapsed),
+                'peak_rss_growth_mb': round(peak - baseline, 1),
+            }
+            print(json.dumps({name: report[name]}), file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Bulk patient import: database time and password hashing throughput.
+
+Imports --rows patients carrying a precomputed password_hash (validation,
+the uniqueness query and the executemany inserts only), then hashes
+--hashes passwords with one worker and with one per CPU. The estimate for a
+full import with plain passwords is the database time plus rows divided by
+the parallel hashing rate.
+
+    python bench/import_users.py --rows 50000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--hashes', type=int, default=64, help='passwords hashed per worker setting')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        from werkzeug.security import generate_password_hash
+        from app import app
+        from imports import hash_passwords, import_users
+        from utils import connect
+
+        hashed = generate_password_hash('bench')
+        rows = [{'username': f'import{i}', 'password_hash': hashed, 'fullname': f'Imported Patient {i}',
+                 'email': f'import{i}@bench.test', 'phone': f'96{i:08d}', 'age': str(20 + i % 60)}
+                for i in range(args.rows)]
+
+        conn = connect(app.config['DATABASE'])
+        started = time.perf_counter()
+        result = import_users(conn, 'patient', rows)
+        database_seconds = time.perf_counter() - started
+        conn.close()
+
+        rates = {}
+        for workers in sorted({1, os.cpu_count() or 1}):
+            started = time.perf_counter()
+            hash_passwords(['bench'] * args.hashes, workers=workers)
+            rates[workers] = args.hashes / (time.perf_counter() - started)
+
+    parallel = rates[max(rates)]
+    print(json.dumps({
+        'rows': args.rows,
+        'imported': result['imported'],
+        'database_seconds': round(database_seconds, 2),
+        'hashes_per_second': {str(workers): round(rate, 1) for workers, rate in rates.items()},
+        'estimated_seconds_with_hashing': round(database_seconds + args.rows / parallel, 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Anonymous public page throughput with and without the rendered-page cache.
+
+    python bench/public_pages.py --seconds 2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+PAGES = ['/', '/treatments', '/success', '/about', '/contact', '/blog']
+
+
+def requests_per_second(client, path, seconds, headers=None):
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        client.get(path, headers=headers)
+        count += 1
+    return round(count / (time.perf_counter() - started), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0, help='measurement time per page and mode')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        from app import app
+        from cache import page_cache
+
+        client = app.test_client()
+        maxsize = page_cache.maxsize
+        report = {}
+        for path in PAGES:
+            page_cache.maxsize = 0
+            page_cache.clear()
+            uncached = requests_per_second(client, path, args.seconds)
+
+            page_cache.maxsize = maxsize
+            etag = client.get(path).headers['ETag']
+            cached = requests_per_second(client, path, args.seconds)
+            not_modified = requests_per_second(client, path, args.seconds, {'If-None-Match': etag})
+            report[path] = {
+                'uncached_rps': uncached,
+                'cached_rps': cached,
+                'not_modified_rps': not_modified,
+                'speedup': round(cached / uncached, 1),
+            }
+        report['cache'] = page_cache.stats()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""GET throughput by reader thread count while bookings run in the background.
+
+Reader threads, each logged in as its own patient, fetch the dashboard,
+doctor profile and availability pages. Meanwhile --writers threads book a
+slot and cancel it again, over and over. Each reader count runs with GETs on
+the read-only pool and again with GETs on the read-write pool.
+
+    python bench/read_lane.py --readers 1,2,4,8 --writers 4 --seconds 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from booking_stress import SLOT_TIMES, seed  # noqa: E402
+
+
+def login(app, index):
+    client = app.test_client()
+    client.post('/login', data={'username': f'stress_patient{index}', 'password': 'bench', 'user_type': 'patient'})
+    return client
+
+
+def reader(app, index, doctor_ids, stop, counts):
+    rng = random.Random(index)
+    client = login(app, index)
+    done = 0
+    while not stop.is_set():
+        doctor_id = rng.choice(doctor_ids)
+        for path in ('/patient/dashboard', f'/patient/doctor/{doctor_id}', f'/patient/doctor/{doctor_id}/availability'):
+            client.get(path)
+            done += 1
+    counts[index] = done
+
+
+def booker(app, index, doctor_ids, stop, counts):
+    from utils import connect
+    rng = random.Random(-1 - index)
+    client = login(app, index)
+    conn = connect(app.config['DATABASE'])
+    patient_id = conn.execute('SELECT p.id FROM patients p JOIN users u ON p.user_id = u.id WHERE u.username = ?',
+                              (f'stress_patient{index}',)).fetchone()[0]
+    today = date.today()
+    done = 0
+    while not stop.is_set():
+        day = (today + timedelta(days=rng.randint(1, 6))).isoformat()
+        response = client.post(f'/patient/doctor/{rng.choice(doctor_ids)}/availability',
+                               data={'appointment_date': day, 'appointment_time': rng.choice(SLOT_TIMES)})
+        if response.status_code != 302:
+            continue
+        row = conn.execute("SELECT id FROM appointments WHERE patient_id = ? AND status = 'Booked' ORDER BY id DESC LIMIT 1",
+                           (patient_id,)).fetchone()
+        client.post(f'/patient/appointment/{row[0]}/cancel')
+        done += 2
+    conn.close()
+    counts[index] = done
+
+
+def run(app, readers, writers, seconds, doctor_ids):
+    stop = threading.Event()
+    read_counts, write_counts = {}, {}
+    threads = [threading.Thread(target=booker, args=(app, i, doctor_ids, stop, write_counts)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(app, writers + i, doctor_ids, stop, read_counts))
+                for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return round(sum(read_counts.values()) / seconds, 1), round(sum(write_counts.values()) / seconds, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', default='1,2,4,8', help='comma-separated reader thread counts')
+    parser.add_argument('--writers', type=int, default=4, help='background booking threads')
+    parser.add_argument('--seconds', type=float, default=3.0, help='measurement time per setting')
+    parser.add_argument('--doctors', type=int, default=20)
+    args = parser.parse_args()
+    reader_counts = [int(n) for n in args.readers.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        from app import app
+        from utils import connect
+
+        conn = connect(app.config['DATABASE'])
+        seed(conn, args.doctors, args.writers + max(reader_counts))
+        doctor_ids = [row[0] for row in conn.execute('SELECT id FROM doctors')]
+        conn.close()
+
+        read_pool = app.extensions['db_read_pool']
+        report = {'cpus': os.cpu_count(), 'writers': args.writers, 'runs': []}
+        for readers in reader_counts:
+            for lane in ('read_only', 'read_write'):
+                if lane == 'read_only':
+                    app.extensions['db_read_pool'] = read_pool
+                else:
+                    app.extensions.pop('db_read_pool', None)
+                reads, writes = run(app, readers, args.writers, args.seconds, doctor_ids)
+                report['runs'].append({'readers': readers, 'get_pool': lane,
+                                       'reads_per_second': reads, 'writes_per_second': writes})
+        app.extensions['db_read_pool'] = read_pool
+        report['pools'] = {'read_only': read_pool.stats(), 'read_write': app.extensions['db_pool'].stats()}
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
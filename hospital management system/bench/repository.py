@@ -0,0 +1,101 @@
+"""Per-query timings for repository.py on a synthetic dataset.
+
+Each query runs --repeat times three ways: through repository (slotted rows),
+as the inline sqlite3.Row + dict code it replaced, and through repository on
+a connection with the statement cache disabled.
+tracemalloc reports the bytes allocated per call.
+
+    python bench/repository.py --patients 20000 --appointments 200000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def timed(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'median_us': round(statistics.median(samples) * 1e6, 1), 'peak_alloc_bytes': allocated}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=20000)
+    parser.add_argument('--appointments', type=int, default=200000)
+    parser.add_argument('--booked', type=float, default=0.2, help='share of appointments still Booked')
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        import dataset
+        import repository
+        from app import app
+        from departments import get_catalog
+        from utils import connect, PRAGMAS
+
+        conn = connect(app.config['DATABASE'])
+        dataset.generate(conn, seed=11, patients=args.patients, appointments=args.appointments, booked=args.booked)
+        patient_id = conn.execute('''
+            SELECT patient_id FROM appointments WHERE status = 'Booked'
+            GROUP BY patient_id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()[0]
+        department_id = conn.execute('''
+            SELECT department_id FROM doctors GROUP BY department_id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()[0]
+        doctor_id = conn.execute('SELECT MIN(id) FROM doctors').fetchone()[0]
+
+        uncached = sqlite3.connect(app.config['DATABASE'], cached_statements=0)
+        for pragma in PRAGMAS:
+            uncached.execute(pragma)
+        uncached.row_factory = sqlite3.Row
+
+        def inline(sql, params, named):
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            return get_catalog(cursor).with_names(rows) if named else [dict(row) for row in rows]
+
+        queries = {
+            'upcoming_for_patient': (repository.upcoming_for_patient, repository.UPCOMING_FOR_PATIENT_SQL,
+                                     patient_id, True),
+            'doctors_in_department': (repository.doctors_in_department, repository.DOCTORS_IN_DEPARTMENT_SQL,
+                                      department_id, False),
+            'active_doctor': (repository.active_doctor, repository.ACTIVE_DOCTOR_SQL, doctor_id, False),
+            'patient_profile': (repository.patient_profile, repository.PATIENT_PROFILE_SQL, patient_id, False),
+        }
+        report = {}
+        for name, (method, sql, param, named) in queries.items():
+            rows = len(inline(sql, (param,), named))
+            report[name] = {
+                'rows': rows,
+                'repository': timed(lambda: method(conn.cursor(), param), args.repeat),
+                'inline_row_dict': timed(lambda: inline(sql, (param,), named), args.repeat),
+                'repository_no_statement_cache': timed(lambda: method(uncached.cursor(), param), args.repeat),
+            }
+        uncached.close()
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
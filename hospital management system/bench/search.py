@@ -0,0 +1,60 @@
+"""Full-text search latency over a large user table.
+
+    python bench/search.py --users 500000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+QUERIES = ('kum', 'priya sharma', 'cardio', 'neurology', 'smith', 'pa', '98765', 'x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        import dataset
+        from app import app
+        from search import search_doctors, search_patients
+        from utils import connect
+
+        conn = connect(app.config['DATABASE'])
+        started = time.perf_counter()
+        doctors = args.users // 100
+        dataset.generate(conn, seed=7, doctors=doctors, patients=args.users - doctors, appointments=0,
+                         availability_days=0, blacklisted=0.01)
+        seed_seconds = time.perf_counter() - started
+
+        results = {}
+        cursor = conn.cursor()
+        for text in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                doctors = search_doctors(cursor, text, include_blacklisted=False)
+                patients = search_patients(cursor, text)
+                timings.append(time.perf_counter() - t0)
+            results[text] = {
+                'median_ms': round(statistics.median(timings) * 1000, 3),
+                'p95_ms': round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1000, 3),
+                'results': len(doctors) + len(patients),
+            }
+        conn.close()
+
+    print(json.dumps({'users': args.users, 'seed_seconds': round(seed_seconds, 1), 'queries': results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Cold-import benchmark for app.py.
+
+Runs `import app` in fresh interpreter processes against an already
+initialised database and fails if the median exceeds the target.
+
+    python bench/startup.py --runs 10 --target 0.75
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_python(code, env=None):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, env=env, check=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--target', type=float, default=0.75, help='median seconds allowed')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, HMS_DATABASE=os.path.join(tmp, 'hospital.db'))
+        first = time_python('import app', env)  # creates schema, hashes admin password
+        runs = [time_python('import app', env) for _ in range(args.runs)]
+
+    # Baseline: bare interpreter start with the same imports Flask needs
+    baseline = statistics.median(
+        time_python('import flask, flask_login, werkzeug.security') for _ in range(args.runs))
+    result = {
+        'first_import': round(first, 4),
+        'median': round(statistics.median(runs), 4),
+        'max': round(max(runs), 4),
+        'interpreter_and_flask': round(baseline, 4),
+        'target': args.target,
+    }
+    print(json.dumps(result, indent=2))
+    return 0 if result['median'] <= args.target else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Per-request cost of the Flask-Login user loader, with and without the user cache.
+
+Logs in a few users and replays authenticated GETs, counting the SQL
+statements each request sends to sqlite. The baseline swaps in a loader with
+no cache and no version stamp: one users query per request, as before the
+cache existed.
+
+    python bench/user_cache.py --users 20 --requests 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def seed(conn, users):
+    from werkzeug.security import generate_password_hash
+    password = generate_password_hash('bench')
+    with conn:
+        for i in range(users):
+            user_id = conn.execute('INSERT INTO users (username, password, role, fullname) VALUES (?, ?, ?, ?)',
+                                   (f'cache_patient{i}', password, 'patient', f'Patient {i}')).lastrowid
+            conn.execute('INSERT INTO patients (user_id) VALUES (?)', (user_id,))
+
+
+def plain_loader(user_id):
+    from models import User, USER_COLUMNS, USER_JOINS
+    from utils import get_db_connection
+    cursor = get_db_connection().cursor()
+    cursor.execute(f'SELECT {USER_COLUMNS} {USER_JOINS} WHERE u.id = ? AND u.is_blacklisted = 0', (user_id,))
+    row = cursor.fetchone()
+    return User.from_row(row) if row else None
+
+
+def run(app, clients, requests, statements):
+    statements.clear()
+    started = time.perf_counter()
+    for i in range(requests):
+        clients[i % len(clients)].get('/patient/profile')
+    elapsed = time.perf_counter() - started
+    user_queries = sum(1 for sql in statements if 'LEFT JOIN doctors d ON d.user_id = u.id' in sql)
+    version_checks = sum(1 for sql in statements if "key = 'users_version'" in sql)
+    return {
+        'requests': requests,
+        'ms_per_request': round(elapsed * 1000 / requests, 3),
+        'statements_per_request': round(len(statements) / requests, 2),
+        'user_loader_queries': user_queries,
+        'version_checks': version_checks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HMS_DATABASE'] = os.path.join(tmp, 'hospital.db')
+        import utils
+        from app import app
+        from models import user_cache, users_version
+
+        conn = utils.connect(app.config['DATABASE'])
+        seed(conn, args.users)
+        conn.close()
+
+        # Record every statement run on pooled connections
+        statements = []
+        connect = utils.connect
+
+        def traced_connect(database, factory=utils.sqlite3.Connection, **kwargs):
+            traced = connect(database, factory, **kwargs)
+            traced.set_trace_callback(statements.append)
+            return traced
+
+        utils.connect = traced_connect
+        for pool in ('db_pool', 'db_read_pool'):
+            if pool in app.extensions:
+                app.extensions[pool].close_all()
+
+        clients = []
+        for i in range(args.users):
+            client = app.test_client()
+            client.post('/login', data={'username': f'cache_patient{i}', 'password': 'bench', 'user_type': 'patient'})
+            clients.append(client)
+
+        cached_loader = app.login_manager._user_callback
+        app.login_manager.user_loader(plain_loader)
+        uncached = run(app, clients, args.requests, statements)
+
+        app.login_manager.user_loader(cached_loader)
+        user_cache.clear()
+        user_cache.hits = user_cache.misses = 0
+        users_version.reset()
+        cached = run(app, clients, args.requests, statements)
+        cached['cache'] = user_cache.stats()
+
+    report = {
+        'uncached': uncached,
+        'cached': cached,
+        # Loader queries and stamp checks alike
+        'round_trips_saved_per_request': round(
+            uncached['statements_per_request'] - cached['statements_per_request'], 3),
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds.
+
+    maxsize=0 disables caching (every get is a miss).
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Rendered anonymous pages, keyed on (path, template mtimes). Template edits
+# change the key; the view's Python data only changes with a restart.
+PAGE_CACHE_CONTROL = 'public, no-cache'
+
+page_cache = TTLCache(maxsize=64, ttl=3600.0)
+
+
+def templates_mtime(templates):
+    folder = os.path.join(current_app.root_path, current_app.template_folder)
+    return max(os.stat(os.path.join(folder, name)).st_mtime_ns for name in templates)
+
+
+def cached_page(*templates):
+    """Serve a view's anonymous response from page_cache with a strong ETag.
+
+    templates lists every file the page renders (page and layouts). Logged-in
+    users and requests with pending flash messages get a fresh render.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_user.is_authenticated or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            key = (request.path, templates_mtime(templates))
+            entry = page_cache.get(key)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (body, response.mimetype, hashlib.sha256(body).hexdigest())
+                page_cache.set(key, entry)
+
+            body, mimetype, etag = entry
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,42 @@
+# In-process copy of the departments table. The triggers from migration 6 bump
+# app_meta 'departments_version' on every change, so each worker process sees
+# writes from any other process after one primary-key lookup.
+
+
+class DepartmentCatalog:
+    def __init__(self, version, rows):
+        self.version = version
+        self.departments = [dict(row) for row in rows]  # ordered by name
+        self.by_id = {department['id']: department for department in self.departments}
+
+    def name(self, department_id):
+        department = self.by_id.get(department_id)
+        return department['name'] if department else None
+
+    def named(self, row):
+        """Copy of a row with a department_id column, plus its department name."""
+        if row is None:
+            return None
+        return dict(row, department=self.name(row['department_id']))
+
+    def with_names(self, rows):
+        return [self.named(row) for row in rows]
+
+
+_catalog = None
+
+
+def get_catalog(cursor):
+    """The current DepartmentCatalog, reloaded if the departments table changed."""
+    global _catalog
+    # Read the version before the rows: a concurrent change then only causes an extra reload
+    cursor.execute("SELECT value FROM app_meta WHERE key = 'departments_version'")
+    row = cursor.fetchone()
+    version = int(row[0]) if row else 0
+
+    catalog = _catalog
+    if catalog is None or catalog.version != version:
+        cursor.execute('SELECT id, name, description FROM departments ORDER BY name')
+        catalog = DepartmentCatalog(version, cursor.fetchall())
+        _catalog = catalog
+    return catalog
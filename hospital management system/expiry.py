@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from utils import connect
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every server process sweeps
+    fcntl = None
+
+# Booked appointments whose date has passed without the doctor completing or
+# cancelling them become 'Expired'. Run `flask db expire-bookings` from cron,
+# or set EXPIRE_INTERVAL_SECONDS to sweep from a timer thread in the app. The
+# thread starts with the first request a process serves, so `flask db ...`
+# commands never run one, and it only sweeps while it holds an exclusive lock
+# on <database>.sweeper.lock: one sweeper per database however many worker
+# processes there are. If that process exits, another worker takes over.
+# Each batch is its own short write transaction (through
+# idx_appointments_status_date), so request writers interleave with a large
+# backlog instead of waiting behind it. The sweeper commits on its own
+# connection rather than through the writer (writer.py): it runs between
+# requests, not inside one.
+EXPIRED_STATUS = 'Expired'
+EXPIRY_BATCH_SIZE = 1000
+
+logger = logging.getLogger('hms.expiry')
+
+
+def expire_before(conn, cutoff, batch_size=EXPIRY_BATCH_SIZE):
+    """Mark Booked appointments dated before cutoff as Expired, batch_size at a time.
+
+    Returns {'appointments', 'batches', 'seconds'}.
+    """
+    started = time.perf_counter()
+    totals = {'appointments': 0, 'batches': 0}
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+
+    while True:
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                UPDATE appointments SET status = ?
+                WHERE id IN (
+                    SELECT id FROM appointments
+                    WHERE status = 'Booked' AND appointment_date < ?
+                    LIMIT ?
+                )
+            ''', (EXPIRED_STATUS, cutoff.isoformat(), batch_size))
+            count = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if count:
+            totals['appointments'] += count
+            totals['batches'] += 1
+        if count < batch_size:
+            break
+
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    return totals
+
+
+def expiry_cutoff(days):
+    """Appointments dated before this are expired: today, less `days` of grace."""
+    return date.today() - timedelta(days=days)
+
+
+class Sweeper:
+    """Daemon thread that runs expire_before every `interval` seconds.
+
+    Only the process holding lock_path's lock sweeps (None: no lock).
+    """
+
+    def __init__(self, database, interval, days=0, batch_size=EXPIRY_BATCH_SIZE, lock_path=None):
+        self.database = database
+        self.lock_path = lock_path
+        self._lock_file = None
+        self.interval = interval
+        self.days = days
+        self.batch_size = batch_size
+        self.runs = 0
+        self.failures = 0
+        self.appointments = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='hms-expiry', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            if self.holds_lock():
+                self.run_once()
+
+    def holds_lock(self):
+        """Take the sweeper lock if it is free; True while this process holds it."""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is None:
+            lock_file = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            # Held, and released by the OS, for the life of the process
+            self._lock_file = lock_file
+        return True
+
+    def run_once(self):
+        cutoff = expiry_cutoff(self.days)
+        try:
+            conn = connect(self.database)
+            try:
+                totals = expire_before(conn, cutoff, self.batch_size)
+            finally:
+                conn.close()
+        except Exception:
+            self.failures += 1
+            logger.exception('Expiry sweep failed')
+            return None
+        self.runs += 1
+        self.appointments += totals['appointments']
+        self.seconds += totals['seconds']
+        if totals['appointments']:
+            logger.info('Expired %d booked appointment(s) dated before %s in %d batch(es), %.3fs',
+                        totals['appointments'], cutoff, totals['batches'], totals['seconds'])
+        return totals
+
+    def stats(self):
+        return {'runs': self.runs, 'failures': self.failures, 'appointments': self.appointments,
+                'seconds': round(self.seconds, 3)}
+
+
+def init_app(app):
+    app.config.setdefault('EXPIRE_AFTER_DAYS', 0)
+    app.config.setdefault('EXPIRE_INTERVAL_SECONDS', None)
+    app.config.setdefault('EXPIRY_BATCH_SIZE', EXPIRY_BATCH_SIZE)
+    if not app.config['EXPIRE_INTERVAL_SECONDS']:
+        return
+    sweeper = Sweeper(app.config['DATABASE'], float(app.config['EXPIRE_INTERVAL_SECONDS']),
+                      days=app.config['EXPIRE_AFTER_DAYS'], batch_size=app.config['EXPIRY_BATCH_SIZE'],
+                      lock_path=os.path.abspath(app.config['DATABASE']) + '.sweeper.lock')
+    app.extensions['expiry_sweeper'] = sweeper
+    # Serving processes only: CLI commands import the app but handle no requests
+    app.before_request(sweeper.start)
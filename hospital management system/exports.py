@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from departments import get_catalog
+from utils import connect
+
+# Admin data exports, streamed straight off an SQLite cursor in fetchmany
+# batches so memory stays flat however many rows match. Each export runs on
+# its own read-only connection rather than a pooled one, so a long download
+# never holds a pool slot; WAL mode keeps writers unblocked meanwhile. With an
+# archive file (archive.py), appointment and treatment exports read the hot
+# and archived rows as one id-ordered stream.
+EXPORT_BATCH_SIZE = 1000
+
+APPOINTMENT_COLUMNS = ('id', 'appointment_date', 'appointment_time', 'status', 'patient_id', 'patient_name',
+                       'doctor_id', 'doctor_name', 'department', 'notes', 'created_at')
+TREATMENT_COLUMNS = ('id', 'appointment_id', 'appointment_date', 'status', 'patient_id', 'doctor_id',
+                     'visit_type', 'tests_done', 'diagnosis', 'prescription', 'medicines', 'notes', 'created_at')
+DOCTOR_COLUMNS = ('id', 'username', 'fullname', 'email', 'phone', 'specialization', 'department',
+                  'experience_years', 'qualification', 'is_blacklisted', 'created_at')
+PATIENT_COLUMNS = ('id', 'username', 'fullname', 'email', 'phone', 'age', 'gender', 'blood_group',
+                   'address', 'is_blacklisted', 'created_at')
+
+# name -> (columns, query, date column, status filter). The date range is
+# inclusive; status is an appointment status, or active/blacklisted for people.
+# {schema} prefixes the tables that may also live in the archive.
+EXPORTS = {
+    'appointments': (APPOINTMENT_COLUMNS, '''
+        SELECT a.id, a.appointment_date, a.appointment_time, a.status,
+               a.patient_id, u1.fullname as patient_name, a.doctor_id, u2.fullname as doctor_name,
+               d.department_id, a.notes, a.created_at
+        FROM {schema}appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN users u1 ON p.user_id = u1.id
+        JOIN doctors d ON a.doctor_id = d.id
+        JOIN users u2 ON d.user_id = u2.id
+    ''', 'a.appointment_date', 'a.status = ?'),
+    'treatments': (TREATMENT_COLUMNS, '''
+        SELECT t.id, t.appointment_id, a.appointment_date, a.status, a.patient_id, a.doctor_id,
+               t.visit_type, t.tests_done, t.diagnosis, t.prescription, t.medicines, t.notes, t.created_at
+        FROM {schema}treatments t
+        JOIN {schema}appointments a ON t.appointment_id = a.id
+    ''', 'a.appointment_date', 'a.status = ?'),
+    'doctors': (DOCTOR_COLUMNS, '''
+        SELECT d.id, u.username, u.fullname, u.email, u.phone, d.specialization, d.department_id,
+               d.experience_years, d.qualification, u.is_blacklisted, u.created_at
+        FROM doctors d
+        JOIN users u ON d.user_id = u.id
+    ''', 'u.created_at', 'u.is_blacklisted = ?'),
+    'patients': (PATIENT_COLUMNS, '''
+        SELECT p.id, u.username, u.fullname, u.email, u.phone, p.age, p.gender, p.blood_group,
+               p.address, u.is_blacklisted, u.created_at
+        FROM patients p
+        JOIN users u ON p.user_id = u.id
+    ''', 'u.created_at', 'u.is_blacklisted = ?'),
+}
+
+# Archived copies of rows that are still hot are skipped, as in history_summary
+ARCHIVED_ONLY = {
+    'appointments': 'NOT EXISTS (SELECT 1 FROM main.appointments h WHERE h.id = a.id)',
+    'treatments': 'NOT EXISTS (SELECT 1 FROM main.treatments h WHERE h.id = t.id)',
+}
+
+APPOINTMENT_STATUSES = ('Booked', 'Completed', 'Cancelled', 'Expired')
+PEOPLE_STATUSES = {'active': 0, 'blacklisted': 1}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def build_query(name, start=None, end=None, status=None, archived=False):
+    """SQL and parameters for an export; start/end are dates, status a string.
+
+    archived adds the rows in the attached archive, merged in id order.
+    """
+    _, sql, date_column, status_filter = EXPORTS[name]
+    conditions, params = [], []
+    if start:
+        conditions.append(f'{date_column} >= ?')
+        params.append(start.isoformat())
+    if end:
+        # created_at carries a time of day, so compare against the next day
+        conditions.append(f'{date_column} < ?')
+        params.append((end + timedelta(days=1)).isoformat())
+    if status:
+        conditions.append(status_filter)
+        params.append(PEOPLE_STATUSES[status] if name in ('doctors', 'patients') else status)
+    if not (archived and name in ARCHIVED_ONLY):
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return f"{sql.format(schema='')}{where} ORDER BY 1", params
+    # SQLite merges the two id-ordered arms rather than sorting their union
+    hot_where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    archive_where = ' WHERE ' + ' AND '.join([*conditions, ARCHIVED_ONLY[name]])
+    return (f"{sql.format(schema='main.')}{hot_where} UNION ALL "
+            f"{sql.format(schema='archive.')}{archive_where} ORDER BY 1"), params * 2
+
+
+def valid_status(name, status):
+    return status in (PEOPLE_STATUSES if name in ('doctors', 'patients') else APPOINTMENT_STATUSES)
+
+
+def export_rows(database, name, start=None, end=None, status=None, batch_size=EXPORT_BATCH_SIZE,
+                archive_database=None):
+    """Yield the export's rows as dicts, batch_size rows in memory at a time."""
+    columns = EXPORTS[name][0]
+    sql, params = build_query(name, start, end, status, archived=bool(archive_database))
+    conn = connect(database, archive_database=archive_database, readonly=True)
+    try:
+        # A one-pass scan gains nothing from the 16 MB page cache or mmap (utils.PRAGMAS)
+        conn.execute('PRAGMA cache_size = -2000')
+        conn.execute('PRAGMA mmap_size = 0')
+        catalog = get_catalog(conn.cursor()) if 'department' in columns else None
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                row = dict(row)
+                if catalog is not None:
+                    row['department'] = catalog.name(row.pop('department_id'))
+                yield row
+    finally:
+        conn.close()
+
+
+def csv_chunks(rows, columns, batch_size=EXPORT_BATCH_SIZE):
+    """Encode rows as CSV with a header line, one chunk per batch_size rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows, columns, batch_size=EXPORT_BATCH_SIZE):
+    """Encode rows as one JSON object per line, one chunk per batch_size rows."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: row[column] for column in columns}))
+        if len(lines) == batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream_export(database, name, fmt, start=None, end=None, status=None, archive_database=None):
+    """Chunks of the encoded export, ready for a streamed Response."""
+    columns = EXPORTS[name][0]
+    encode = csv_chunks if fmt == 'csv' else ndjson_chunks
+    return encode(export_rows(database, name, start, end, status, archive_database=archive_database), columns)
@@ -0,0 +1,96 @@
+from flask import current_app, request
+
+from archive import archived_through
+from departments import get_catalog
+from utils import decode_cursor, keyset_page
+
+# Treatment history for the patient, doctor and admin history views. Pages
+# carry only the summary columns (served from idx_appointments_patient_date
+# and idx_treatments_summary, migration 8); the free-text details of a visit
+# are fetched one at a time by the views' JSON detail endpoints. With an
+# archive attached (archive.py), a page that reaches archived dates is read
+# from the history_summary view over both files instead of the hot tables.
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
+DETAIL_FIELDS = ('visit_type', 'tests_done', 'diagnosis', 'prescription', 'medicines')
+
+
+def history_key(row):
+    return [row['appointment_date'], row['created_at'], row['id']]
+
+
+def page_args():
+    """(after, limit) from the query string of a "Load more" request."""
+    after = request.args.get('after')
+    after = decode_cursor(after, 3) if after else None
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    return after, max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+
+
+HOT_HISTORY = '''(
+    SELECT t.id, t.created_at, t.visit_type, a.appointment_date, a.patient_id, a.doctor_id
+    FROM appointments a JOIN treatments t ON t.appointment_id = a.id
+)'''
+
+
+def query_history(cursor, source, patient_id, after, count, doctor_id):
+    conditions, params = '', [patient_id]
+    if doctor_id is not None:
+        conditions += ' AND h.doctor_id = ?'
+        params.append(doctor_id)
+    if after:
+        # The <= lets SQLite seek the date index; the row value breaks ties
+        conditions += ' AND h.appointment_date <= ? AND (h.appointment_date, h.created_at, h.id) < (?, ?, ?)'
+        params += [after[0], *after]
+    cursor.execute(f'''
+        SELECT h.id, h.created_at, h.visit_type, h.appointment_date,
+               u.fullname as doctor_name, d.department_id
+        FROM {source} h
+        JOIN doctors d ON h.doctor_id = d.id
+        JOIN users u ON d.user_id = u.id
+        WHERE h.patient_id = ? {conditions}
+        ORDER BY h.appointment_date DESC, h.created_at DESC, h.id DESC
+        LIMIT ?
+    ''', [*params, count])
+    return cursor.fetchall()
+
+
+def fetch_history(cursor, patient_id, after=None, limit=HISTORY_PAGE_SIZE, doctor_id=None):
+    """One page of a patient's treatments, newest visit first.
+
+    doctor_id restricts the history to visits with that doctor.
+    """
+    rows = query_history(cursor, HOT_HISTORY, patient_id, after, limit + 1, doctor_id)
+    if current_app.config.get('ARCHIVE_DATABASE'):
+        # Archived visits are all dated on or before archived_through, so a
+        # full page that ends after that date cannot include any of them
+        through = archived_through(cursor)
+        if through is not None and (len(rows) <= limit or rows[-1]['appointment_date'] <= through):
+            rows = query_history(cursor, 'history_summary', patient_id, after, limit + 1, doctor_id)
+    rows = get_catalog(cursor).with_names(rows)
+    return keyset_page(rows, limit, history_key)
+
+
+TREATMENT_SQL = '''
+    SELECT t.id, t.visit_type, t.tests_done, t.diagnosis, t.prescription, t.medicines,
+           t.created_at, a.appointment_date, a.patient_id, a.doctor_id
+    FROM {schema}.treatments t
+    JOIN {schema}.appointments a ON t.appointment_id = a.id
+    WHERE t.id = ?
+'''
+
+
+def fetch_treatment(cursor, treatment_id):
+    """Full treatment row with the owning patient and doctor ids, or None."""
+    cursor.execute(TREATMENT_SQL.format(schema='main'), (treatment_id,))
+    row = cursor.fetchone()
+    if row is None and current_app.config.get('ARCHIVE_DATABASE'):
+        cursor.execute(TREATMENT_SQL.format(schema='archive'), (treatment_id,))
+        row = cursor.fetchone()
+    return row
+
+
+def treatment_details(row):
+    return {'id': row['id'], 'appointment_date': row['appointment_date'],
+            **{field: row[field] for field in DETAIL_FIELDS}}
@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from departments import get_catalog
+
+# Bulk creation of doctor and patient accounts from CSV or JSON (`flask db
+# import-users`, admin.import_users). Every row is validated up front, name
+# and email clashes are found with one query, passwords are hashed on every
+# core, and the accepted rows go in with executemany in a single transaction.
+# Rejected rows are reported by number and skipped.
+REQUIRED_FIELDS = {
+    'doctor': ('username', 'fullname', 'specialization'),
+    'patient': ('username', 'fullname', 'email', 'phone'),
+}
+INTEGER_FIELDS = ('department_id', 'experience_years', 'age')
+
+USER_INSERT = '''
+    INSERT INTO users (id, username, password, role, fullname, email, phone)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+PROFILE_INSERTS = {
+    'doctor': ('''
+        INSERT INTO doctors (user_id, specialization, department_id, experience_years, qualification, bio)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ('specialization', 'department_id', 'experience_years', 'qualification', 'bio')),
+    'patient': ('''
+        INSERT INTO patients (user_id, age, gender, address, blood_group)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ('age', 'gender', 'address', 'blood_group')),
+}
+
+# Below this many passwords a worker pool costs more than it saves
+POOL_THRESHOLD = 16
+
+
+class ImportFileError(ValueError):
+    """The file itself could not be read (bad format, not a list of records)."""
+
+
+def read_rows(data, fmt):
+    """Parse CSV or JSON (a list of objects) into a list of dicts."""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(data)))
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except ValueError as e:
+            raise ImportFileError(f'Invalid JSON: {e}')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ImportFileError('JSON imports must be a list of objects.')
+        return rows
+    raise ImportFileError(f'Unsupported format: {fmt}')
+
+
+def file_format(filename):
+    return os.path.splitext(filename or '')[1].lower().lstrip('.')
+
+
+def is_password_hash(value):
+    # werkzeug format: method$salt$hash
+    return isinstance(value, str) and value.count('$') == 2 and value.split('$', 1)[0].split(':')[0] in ('scrypt', 'pbkdf2')
+
+
+def clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_rows(rows, role, catalog):
+    """Normalize rows and check them in isolation and against each other.
+
+    Returns (records, errors): records are (number, dict) pairs ready to
+    insert, errors (number, message) pairs. Rows are numbered from 1.
+    """
+    records, errors = [], []
+    seen_usernames, seen_emails = set(), set()
+    departments = {department['name'].lower(): department['id'] for department in catalog.departments}
+
+    for number, row in enumerate(rows, 1):
+        record = {key: clean(value) for key, value in row.items() if key}
+        problems = [f'{field} is required' for field in REQUIRED_FIELDS[role] if not record.get(field)]
+
+        if not record.get('password') and not is_password_hash(record.get('password_hash')):
+            problems.append('password or password_hash is required')
+
+        for field in INTEGER_FIELDS:
+            if record.get(field) is not None:
+                try:
+                    record[field] = int(record[field])
+                except ValueError:
+                    problems.append(f'{field} must be a whole number')
+
+        if role == 'doctor':
+            if record.get('department') and record.get('department_id') is None:
+                record['department_id'] = departments.get(record['department'].lower())
+                if record['department_id'] is None:
+                    problems.append(f"unknown department '{record['department']}'")
+            elif isinstance(record.get('department_id'), int) and catalog.name(record['department_id']) is None:
+                problems.append(f"unknown department_id {record['department_id']}")
+
+        username, email = record.get('username'), record.get('email')
+        if username and username in seen_usernames:
+            problems.append(f"username '{username}' appears more than once in the file")
+        if email and email in seen_emails:
+            problems.append(f"email '{email}' appears more than once in the file")
+
+        if problems:
+            errors.append((number, '; '.join(problems)))
+            continue
+        seen_usernames.add(username)
+        if email:
+            seen_emails.add(email)
+        records.append((number, record))
+    return records, errors
+
+
+def find_taken(cursor, records):
+    """Usernames and emails of records that already exist, in one query."""
+    usernames = [record['username'] for _, record in records]
+    emails = [record['email'] for _, record in records if record.get('email')]
+    # json_each keeps it one statement however many rows (no bound-variable limit)
+    cursor.execute('''
+        SELECT username, email FROM users
+        WHERE username IN (SELECT value FROM json_each(?))
+        OR email IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(usernames), json.dumps(emails)))
+    taken_usernames, taken_emails = set(), set()
+    for username, email in cursor.fetchall():
+        taken_usernames.add(username)
+        if email:
+            taken_emails.add(email)
+    return taken_usernames, taken_emails
+
+
+def reject_taken(cursor, records, errors):
+    taken_usernames, taken_emails = find_taken(cursor, records)
+    if not taken_usernames and not taken_emails:
+        return records
+    accepted = []
+    for number, record in records:
+        problems = []
+        if record['username'] in taken_usernames:
+            problems.append(f"username '{record['username']}' already exists")
+        if record.get('email') and record['email'] in taken_emails:
+            problems.append(f"email '{record['email']}' is already registered")
+        if problems:
+            errors.append((number, '; '.join(problems)))
+        else:
+            accepted.append((number, record))
+    return accepted
+
+
+def count_passwords(rows):
+    """Rows that carry a plaintext password, i.e. that will need hashing."""
+    return sum(1 for row in rows if clean(row.get('password')))
+
+
+def hash_passwords(passwords, workers=None):
+    """generate_password_hash over a list, spread across CPU cores.
+
+    Threads suffice: hashlib's scrypt and pbkdf2 release the GIL while they
+    run, and unlike a process pool they never re-import the app's __main__.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [generate_password_hash(password) for password in passwords]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(generate_password_hash, passwords))
+
+
+def import_users(conn, role, rows, workers=None, dry_run=False, write=None):
+    """Create accounts for every valid row in one transaction.
+
+    Returns {'total', 'valid', 'imported', 'errors'}; errors is a sorted list
+    of (row number, message). dry_run validates without hashing or writing.
+    write, if given, runs the insert as a write unit (writer.write);
+    otherwise it is a transaction on conn.
+    """
+    cursor = conn.cursor()
+    records, errors = validate_rows(rows, role, get_catalog(cursor))
+    records = reject_taken(cursor, records, errors) if records else records
+
+    if records and not dry_run:
+        # Hash before taking the write lock; rows that carry a hash are used as is
+        plain = [(i, record['password']) for i, (_, record) in enumerate(records) if record.get('password')]
+        for (i, _), hashed in zip(plain, hash_passwords([password for _, password in plain], workers)):
+            records[i][1]['password_hash'] = hashed
+
+        def insert(cursor):
+            # Another writer may have taken a name while we were hashing
+            accepted = reject_taken(cursor, records, errors)
+            # Explicit ids link the profile rows; like AUTOINCREMENT, never reuse a deleted user's id
+            cursor.execute('''
+                SELECT MAX(IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'users'), 0),
+                           IFNULL((SELECT MAX(id) FROM users), 0))
+            ''')
+            first_id = cursor.fetchone()[0] + 1
+            user_ids = range(first_id, first_id + len(accepted))
+            cursor.executemany(USER_INSERT, (
+                (user_id, record['username'], record['password_hash'], role, record['fullname'],
+                 record.get('email'), record.get('phone'))
+                for user_id, (_, record) in zip(user_ids, accepted)))
+            sql, fields = PROFILE_INSERTS[role]
+            cursor.executemany(sql, (
+                (user_id, *(record.get(field) for field in fields))
+                for user_id, (_, record) in zip(user_ids, accepted)))
+            return accepted
+
+        if write is not None:
+            records = write(insert)
+        else:
+            if conn.in_transaction:
+                conn.commit()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                records = insert(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    errors.sort()
+    return {'total': len(rows), 'valid': len(records), 'imported': 0 if dry_run else len(records), 'errors': errors}
@@ -0,0 +1,203 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+# Per-endpoint request metrics, rendered as Prometheus text by admin.metrics.
+# Each thread records into its own shard without locking; a scrape merges the
+# shards, so a reading may be a few increments behind but never blocks requests.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+WRITER_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class EndpointStats:
+    __slots__ = ('count', 'duration_sum', 'duration_buckets', 'statements_sum', 'statement_buckets',
+                 'sql_time', 'rows')
+
+    def __init__(self):
+        self.count = 0
+        self.duration_sum = 0.0
+        self.duration_buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.statements_sum = 0
+        self.statement_buckets = [0] * (len(STATEMENT_BUCKETS) + 1)
+        self.sql_time = 0.0
+        self.rows = 0
+
+    def merge(self, other):
+        self.count += other.count
+        self.duration_sum += other.duration_sum
+        self.statements_sum += other.statements_sum
+        self.sql_time += other.sql_time
+        self.rows += other.rows
+        for i, value in enumerate(other.duration_buckets):
+            self.duration_buckets[i] += value
+        for i, value in enumerate(other.statement_buckets):
+            self.statement_buckets[i] += value
+
+
+class Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, endpoint, duration, statements, sql_time, rows):
+        shard = self._shard()
+        stats = shard.get(endpoint)
+        if stats is None:
+            stats = shard[endpoint] = EndpointStats()
+        stats.count += 1
+        stats.duration_sum += duration
+        stats.duration_buckets[bisect_left(DURATION_BUCKETS, duration)] += 1
+        stats.statements_sum += statements
+        stats.statement_buckets[bisect_left(STATEMENT_BUCKETS, statements)] += 1
+        stats.sql_time += sql_time
+        stats.rows += rows
+
+    def snapshot(self):
+        """Merged {endpoint: EndpointStats} over every thread."""
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for endpoint, stats in list(shard.items()):
+                merged.setdefault(endpoint, EndpointStats()).merge(stats)
+        return merged
+
+
+registry = Registry()
+
+
+def before_request():
+    g.request_started = time.perf_counter()
+
+
+def record_write(statements, sql_time, rows):
+    """Count a write unit run on the writer's connection against the current request."""
+    if 'request_started' in g:
+        totals = g.get('write_sql', (0, 0.0, 0))
+        g.write_sql = (totals[0] + statements, totals[1] + sql_time, totals[2] + rows)
+
+
+def teardown_request(exception=None):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    conn = g.get('db')
+    statements, sql_time, rows = g.pop('write_sql', (0, 0.0, 0))
+    registry.record(request.endpoint or 'unmatched', time.perf_counter() - started,
+                    getattr(conn, 'statements', 0) + statements, getattr(conn, 'sql_time', 0.0) + sql_time,
+                    getattr(conn, 'rows', 0) + rows)
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    if app.config['METRICS_ENABLED']:
+        app.before_request(before_request)
+        app.teardown_request(teardown_request)
+
+
+def _histogram(lines, name, labels, bounds, buckets, total, count):
+    cumulative = 0
+    for bound, value in zip(bounds, buckets):
+        cumulative += value
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f'{name}_sum{{{labels}}} {total}')
+    lines.append(f'{name}_count{{{labels}}} {count}')
+
+
+def render(pools=None, caches=None, expiry=None, writer=None):
+    """Prometheus text exposition of the request, pool, cache, expiry sweeper and writer metrics.
+
+    pools and caches map a label value to that pool's or cache's stats().
+    """
+    snapshot = sorted(registry.snapshot().items())
+    lines = [
+        '# HELP hms_request_duration_seconds Request wall time by endpoint.',
+        '# TYPE hms_request_duration_seconds histogram',
+    ]
+    for endpoint, stats in snapshot:
+        _histogram(lines, 'hms_request_duration_seconds', f'endpoint="{endpoint}"',
+                   DURATION_BUCKETS, stats.duration_buckets, stats.duration_sum, stats.count)
+
+    lines += [
+        '# HELP hms_request_sql_statements SQL statements executed per request by endpoint.',
+        '# TYPE hms_request_sql_statements histogram',
+    ]
+    for endpoint, stats in snapshot:
+        _histogram(lines, 'hms_request_sql_statements', f'endpoint="{endpoint}"',
+                   STATEMENT_BUCKETS, stats.statement_buckets, stats.statements_sum, stats.count)
+
+    lines += [
+        '# HELP hms_sql_seconds_total Time spent in SQL execute and fetch calls by endpoint.',
+        '# TYPE hms_sql_seconds_total counter',
+    ]
+    lines += [f'hms_sql_seconds_total{{endpoint="{endpoint}"}} {stats.sql_time}' for endpoint, stats in snapshot]
+    lines += [
+        '# HELP hms_sql_rows_fetched_total Rows fetched from SQLite by endpoint.',
+        '# TYPE hms_sql_rows_fetched_total counter',
+    ]
+    lines += [f'hms_sql_rows_fetched_total{{endpoint="{endpoint}"}} {stats.rows}' for endpoint, stats in snapshot]
+
+    if pools:
+        for key, kind, help_text in (
+            ('open', 'gauge', 'Open pooled connections.'),
+            ('idle', 'gauge', 'Idle pooled connections.'),
+            ('in_use', 'gauge', 'Pooled connections checked out.'),
+            ('acquired', 'counter', 'Connections handed out by the pool.'),
+            ('waits', 'counter', 'Acquisitions that had to wait for a free connection.'),
+            ('wait_time_total', 'counter', 'Seconds spent waiting for a connection.'),
+            ('wait_time_max', 'gauge', 'Longest wait for a connection in seconds.'),
+        ):
+            name = f'hms_db_pool_{key}' + ('_total' if kind == 'counter' and not key.endswith('_total') else '')
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{{pool="{pool}"}} {stats[key]}' for pool, stats in sorted(pools.items())]
+
+    if caches:
+        for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('size', 'gauge')):
+            name = f'hms_cache_{key}' + ('_total' if kind == 'counter' else '')
+            lines += [f'# TYPE {name} {kind}']
+            lines += [f'{name}{{cache="{cache}"}} {stats[key]}' for cache, stats in sorted(caches.items())]
+
+    if expiry:
+        for key, help_text in (
+            ('runs', 'Completed expiry sweeps.'),
+            ('failures', 'Expiry sweeps that raised.'),
+            ('appointments', 'Booked appointments marked Expired by the sweeper.'),
+            ('seconds', 'Time spent in expiry sweeps.'),
+        ):
+            name = f'hms_expiry_{key}_total'
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {expiry[key]}']
+
+    if writer:
+        for key, kind, help_text in (
+            ('depth', 'gauge', 'Write units waiting for the writer thread.'),
+            ('max_depth', 'gauge', 'Deepest the write queue has been.'),
+            ('units', 'counter', 'Write units run.'),
+            ('failed', 'counter', 'Write units that raised or whose transaction failed.'),
+            ('rejected', 'counter', 'Write units refused or abandoned with a 503 (queue full, result timeout).'),
+            ('restarts', 'counter', 'Times the writer thread was started again after dying.'),
+            ('wait_time_total', 'counter', 'Seconds write units spent queued.'),
+            ('transaction_time_total', 'counter', 'Seconds spent in write transactions, commit included.'),
+        ):
+            name = f'hms_writer_{key}' + ('_total' if kind == 'counter' and not key.endswith('_total') else '')
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {writer[key]}']
+        lines += [
+            '# HELP hms_writer_batch_size Write units committed per transaction.',
+            '# TYPE hms_writer_batch_size histogram',
+        ]
+        _histogram(lines, 'hms_writer_batch_size', 'writer="main"', WRITER_BATCH_BUCKETS,
+                   writer['batch_buckets'], writer['units'], writer['batches'])
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,342 @@
+import sqlite3
+
+# Numbered schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit a migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    (1, 'Hot-path indexes for appointments, doctors, patients and treatments', '''
+        -- doctor.dashboard, patient.check_availability: doctor_id + status, range on date
+        CREATE INDEX IF NOT EXISTS idx_appointments_doctor_status_date
+            ON appointments (doctor_id, status, appointment_date, appointment_time, patient_id);
+
+        -- patient.dashboard, public.index, history views: patient_id + status, ordered by date
+        CREATE INDEX IF NOT EXISTS idx_appointments_patient_status_date
+            ON appointments (patient_id, status, appointment_date, appointment_time, doctor_id);
+
+        -- admin.dashboard upcoming/past lists: status, ordered by date and time
+        CREATE INDEX IF NOT EXISTS idx_appointments_status_date
+            ON appointments (status, appointment_date, appointment_time);
+
+        -- treatments joined from appointments
+        CREATE INDEX IF NOT EXISTS idx_treatments_appointment
+            ON treatments (appointment_id, created_at);
+
+        -- current_user -> profile lookups
+        CREATE INDEX IF NOT EXISTS idx_patients_user ON patients (user_id);
+        CREATE INDEX IF NOT EXISTS idx_doctors_user ON doctors (user_id);
+
+        -- patient.view_department
+        CREATE INDEX IF NOT EXISTS idx_doctors_department ON doctors (department_id);
+
+        -- auth.register email uniqueness check
+        CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+    '''),
+    (2, 'Keyset pagination index for the admin doctor and patient lists', '''
+        -- admin.dashboard orders users by (IFNULL(fullname, ''), id) within a role
+        CREATE INDEX IF NOT EXISTS idx_users_role_name
+            ON users (role, IFNULL(fullname, ''));
+    '''),
+    (3, 'Trigger-maintained counters for the admin dashboard', '''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        DELETE FROM stats_counters;
+        INSERT INTO stats_counters (name, value) SELECT 'doctors', COUNT(*) FROM doctors;
+        INSERT INTO stats_counters (name, value) SELECT 'patients', COUNT(*) FROM patients;
+        INSERT INTO stats_counters (name, value)
+            SELECT 'appointments.status.' || IFNULL(status, ''), COUNT(*)
+            FROM appointments GROUP BY 1;
+        INSERT INTO stats_counters (name, value)
+            SELECT 'appointments.department.' || IFNULL(d.department_id, 'none'), COUNT(*)
+            FROM appointments a LEFT JOIN doctors d ON a.doctor_id = d.id GROUP BY 1;
+
+        CREATE TRIGGER IF NOT EXISTS stats_doctors_insert AFTER INSERT ON doctors BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('doctors', 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_doctors_delete AFTER DELETE ON doctors BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'doctors';
+            -- the doctor's appointments no longer belong to a department
+            INSERT INTO stats_counters (name, value)
+                SELECT 'appointments.department.none', COUNT(*) FROM appointments WHERE doctor_id = OLD.id
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+            UPDATE stats_counters
+                SET value = value - (SELECT COUNT(*) FROM appointments WHERE doctor_id = OLD.id)
+                WHERE name = 'appointments.department.' || IFNULL(OLD.department_id, 'none');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_doctors_department AFTER UPDATE OF department_id ON doctors
+        WHEN OLD.department_id IS NOT NEW.department_id BEGIN
+            INSERT INTO stats_counters (name, value)
+                SELECT 'appointments.department.' || IFNULL(NEW.department_id, 'none'), COUNT(*)
+                FROM appointments WHERE doctor_id = NEW.id
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+            UPDATE stats_counters
+                SET value = value - (SELECT COUNT(*) FROM appointments WHERE doctor_id = NEW.id)
+                WHERE name = 'appointments.department.' || IFNULL(OLD.department_id, 'none');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_patients_insert AFTER INSERT ON patients BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('patients', 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_patients_delete AFTER DELETE ON patients BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'patients';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_appointments_insert AFTER INSERT ON appointments BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('appointments.status.' || IFNULL(NEW.status, ''), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_counters (name, value)
+                VALUES ('appointments.department.' ||
+                        IFNULL((SELECT department_id FROM doctors WHERE id = NEW.doctor_id), 'none'), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_appointments_delete AFTER DELETE ON appointments BEGIN
+            UPDATE stats_counters SET value = value - 1
+                WHERE name = 'appointments.status.' || IFNULL(OLD.status, '');
+            UPDATE stats_counters SET value = value - 1
+                WHERE name = 'appointments.department.' ||
+                      IFNULL((SELECT department_id FROM doctors WHERE id = OLD.doctor_id), 'none');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_appointments_status AFTER UPDATE OF status ON appointments
+        WHEN OLD.status IS NOT NEW.status BEGIN
+            UPDATE stats_counters SET value = value - 1
+                WHERE name = 'appointments.status.' || IFNULL(OLD.status, '');
+            INSERT INTO stats_counters (name, value) VALUES ('appointments.status.' || IFNULL(NEW.status, ''), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_appointments_doctor AFTER UPDATE OF doctor_id ON appointments
+        WHEN OLD.doctor_id IS NOT NEW.doctor_id BEGIN
+            UPDATE stats_counters SET value = value - 1
+                WHERE name = 'appointments.department.' ||
+                      IFNULL((SELECT department_id FROM doctors WHERE id = OLD.doctor_id), 'none');
+            INSERT INTO stats_counters (name, value)
+                VALUES ('appointments.department.' ||
+                        IFNULL((SELECT department_id FROM doctors WHERE id = NEW.doctor_id), 'none'), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+        END;
+    '''),
+    (4, 'FTS5 search indexes over doctors and patients', '''
+        -- rowid is doctors.id / patients.id; kept in sync by the triggers below
+        CREATE VIRTUAL TABLE IF NOT EXISTS doctor_search USING fts5(
+            fullname, specialization, department, blacklisted UNINDEXED,
+            prefix = '2 3'
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5(
+            fullname, email, phone, blacklisted UNINDEXED,
+            prefix = '2 3'
+        );
+
+        DELETE FROM doctor_search;
+        INSERT INTO doctor_search (rowid, fullname, specialization, department, blacklisted)
+            SELECT d.id, u.fullname, d.specialization, dept.name, u.is_blacklisted
+            FROM doctors d
+            JOIN users u ON d.user_id = u.id
+            LEFT JOIN departments dept ON d.department_id = dept.id;
+        DELETE FROM patient_search;
+        INSERT INTO patient_search (rowid, fullname, email, phone, blacklisted)
+            SELECT p.id, u.fullname, u.email, u.phone, u.is_blacklisted
+            FROM patients p
+            JOIN users u ON p.user_id = u.id;
+
+        CREATE TRIGGER IF NOT EXISTS search_doctors_insert AFTER INSERT ON doctors BEGIN
+            INSERT INTO doctor_search (rowid, fullname, specialization, department, blacklisted)
+                SELECT NEW.id, u.fullname, NEW.specialization,
+                       (SELECT name FROM departments WHERE id = NEW.department_id), u.is_blacklisted
+                FROM users u WHERE u.id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS search_doctors_update AFTER UPDATE OF specialization, department_id ON doctors BEGIN
+            UPDATE doctor_search
+                SET specialization = NEW.specialization,
+                    department = (SELECT name FROM departments WHERE id = NEW.department_id)
+                WHERE rowid = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS search_doctors_delete AFTER DELETE ON doctors BEGIN
+            DELETE FROM doctor_search WHERE rowid = OLD.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS search_patients_insert AFTER INSERT ON patients BEGIN
+            INSERT INTO patient_search (rowid, fullname, email, phone, blacklisted)
+                SELECT NEW.id, u.fullname, u.email, u.phone, u.is_blacklisted
+                FROM users u WHERE u.id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS search_patients_delete AFTER DELETE ON patients BEGIN
+            DELETE FROM patient_search WHERE rowid = OLD.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS search_users_update AFTER UPDATE OF fullname, email, phone, is_blacklisted ON users BEGIN
+            UPDATE doctor_search SET fullname = NEW.fullname, blacklisted = NEW.is_blacklisted
+                WHERE rowid IN (SELECT id FROM doctors WHERE user_id = NEW.id);
+            UPDATE patient_search
+                SET fullname = NEW.fullname, email = NEW.email, phone = NEW.phone, blacklisted = NEW.is_blacklisted
+                WHERE rowid IN (SELECT id FROM patients WHERE user_id = NEW.id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS search_departments_update AFTER UPDATE OF name ON departments BEGIN
+            UPDATE doctor_search SET department = NEW.name
+                WHERE rowid IN (SELECT id FROM doctors WHERE department_id = NEW.id);
+        END;
+    '''),
+    (5, 'At most one booked appointment per doctor slot', '''
+        -- Keep the earliest booking of any slot that was double-booked before this constraint
+        UPDATE appointments SET status = 'Cancelled'
+            WHERE status = 'Booked'
+            AND id NOT IN (
+                SELECT MIN(id) FROM appointments
+                WHERE status = 'Booked'
+                GROUP BY doctor_id, appointment_date, appointment_time
+            );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_booked_slot
+            ON appointments (doctor_id, appointment_date, appointment_time)
+            WHERE status = 'Booked';
+    '''),
+    (6, 'Version stamp for the in-process department catalog', '''
+        -- departments.get_catalog() reloads whenever this changes, in any process
+        INSERT OR IGNORE INTO app_meta (key, value) VALUES ('departments_version', 1);
+
+        CREATE TRIGGER IF NOT EXISTS catalog_departments_insert AFTER INSERT ON departments BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'departments_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS catalog_departments_update AFTER UPDATE ON departments BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'departments_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS catalog_departments_delete AFTER DELETE ON departments BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'departments_version';
+        END;
+    '''),
+    (7, 'Doctor-patient roster maintained on booking', '''
+        -- doctor.dashboard patient list: one row per doctor and patient with any
+        -- appointment (any status), so the page never scans a doctor's history
+        CREATE TABLE IF NOT EXISTS doctor_patients (
+            doctor_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL,
+            first_visit DATE NOT NULL,
+            last_visit DATE NOT NULL,
+            visits INTEGER NOT NULL,
+            PRIMARY KEY (doctor_id, patient_id)
+        ) WITHOUT ROWID;
+
+        INSERT OR IGNORE INTO doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+            SELECT doctor_id, patient_id, MIN(appointment_date), MAX(appointment_date), COUNT(*)
+            FROM appointments GROUP BY doctor_id, patient_id;
+
+        -- Keyset pagination, most recently seen patients first
+        CREATE INDEX IF NOT EXISTS idx_doctor_patients_recent
+            ON doctor_patients (doctor_id, last_visit, patient_id);
+
+        CREATE TRIGGER IF NOT EXISTS roster_appointments_insert AFTER INSERT ON appointments BEGIN
+            INSERT INTO doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+                VALUES (NEW.doctor_id, NEW.patient_id, NEW.appointment_date, NEW.appointment_date, 1)
+                ON CONFLICT (doctor_id, patient_id) DO UPDATE SET
+                    first_visit = MIN(first_visit, excluded.first_visit),
+                    last_visit = MAX(last_visit, excluded.last_visit),
+                    visits = visits + 1;
+        END;
+
+        -- Deletes and reassignments are rare; recompute the affected pairs
+        CREATE TRIGGER IF NOT EXISTS roster_appointments_delete AFTER DELETE ON appointments BEGIN
+            DELETE FROM doctor_patients WHERE doctor_id = OLD.doctor_id AND patient_id = OLD.patient_id;
+            INSERT INTO doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+                SELECT doctor_id, patient_id, MIN(appointment_date), MAX(appointment_date), COUNT(*)
+                FROM appointments WHERE doctor_id = OLD.doctor_id AND patient_id = OLD.patient_id
+                GROUP BY doctor_id, patient_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS roster_appointments_update
+        AFTER UPDATE OF doctor_id, patient_id, appointment_date ON appointments BEGIN
+            DELETE FROM doctor_patients
+                WHERE (doctor_id = OLD.doctor_id AND patient_id = OLD.patient_id)
+                OR (doctor_id = NEW.doctor_id AND patient_id = NEW.patient_id);
+            INSERT INTO doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+                SELECT doctor_id, patient_id, MIN(appointment_date), MAX(appointment_date), COUNT(*)
+                FROM appointments
+                WHERE (doctor_id = OLD.doctor_id AND patient_id = OLD.patient_id)
+                OR (doctor_id = NEW.doctor_id AND patient_id = NEW.patient_id)
+                GROUP BY doctor_id, patient_id;
+        END;
+    '''),
+    (8, 'Covering indexes for the paginated treatment history', '''
+        -- history views: a patient's appointments newest first, optionally with one doctor
+        CREATE INDEX IF NOT EXISTS idx_appointments_patient_date
+            ON appointments (patient_id, appointment_date, doctor_id);
+
+        -- history summaries read treatments without touching the free-text columns
+        CREATE INDEX IF NOT EXISTS idx_treatments_summary
+            ON treatments (appointment_id, created_at, visit_type);
+
+        -- a prefix of idx_treatments_summary
+        DROP INDEX IF EXISTS idx_treatments_appointment;
+    '''),
+    (9, 'Roster delete trigger for archiving', '''
+        -- archive.archive_before() deletes the appointments it moves through this
+        -- trigger like any other delete, then recomputes the pairs it touched from
+        -- hot and archived rows (archive.ROSTER_REFRESH_SQL) in the same transaction
+        DROP TRIGGER IF EXISTS roster_appointments_delete;
+        CREATE TRIGGER roster_appointments_delete AFTER DELETE ON appointments BEGIN
+            DELETE FROM doctor_patients WHERE doctor_id = OLD.doctor_id AND patient_id = OLD.patient_id;
+            INSERT INTO doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+                SELECT doctor_id, patient_id, MIN(appointment_date), MAX(appointment_date), COUNT(*)
+                FROM appointments WHERE doctor_id = OLD.doctor_id AND patient_id = OLD.patient_id
+                GROUP BY doctor_id, patient_id;
+        END;
+    '''),
+    (10, 'Version stamp for the logged-in user cache', '''
+        -- models.user_cache entries are only trusted while this is unchanged, so
+        -- blacklisting or editing a user applies at once in every process
+        INSERT OR IGNORE INTO app_meta (key, value) VALUES ('users_version', 1);
+
+        CREATE TRIGGER IF NOT EXISTS user_cache_users_update AFTER UPDATE ON users BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'users_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS user_cache_users_delete AFTER DELETE ON users BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'users_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS user_cache_doctors_delete AFTER DELETE ON doctors BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'users_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS user_cache_patients_delete AFTER DELETE ON patients BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE key = 'users_version';
+        END;
+    '''),
+]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version.
+
+    Each migration runs in its own transaction together with the
+    user_version bump, so a failed migration leaves the schema untouched.
+    Returns the list of migration numbers that were applied.
+    """
+    applied = []
+    version = current_version(conn)
+    for number, description, script in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            conn.executescript(f'BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        applied.append(number)
+    return applied
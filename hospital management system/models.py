@@ -1,10 +1,88 @@
-from flask_login import UserMixin
 import sqlite3
+import time
+from cache import TTLCache
 
-class User(UserMixin):
-    def __init__(self, user_id, username, role, fullname):
+# Columns and joins needed to build a User, including the role-specific profile id
+USER_COLUMNS = 'u.id, u.username, u.role, u.fullname, p.id as patient_id, d.id as doctor_id'
+USER_JOINS = '''
+    FROM users u
+    LEFT JOIN patients p ON p.user_id = u.id
+    LEFT JOIN doctors d ON d.user_id = u.id
+'''
+
+class User:
+    """Logged-in user as seen by Flask-Login.
+
+    patient_id / doctor_id hold the id of the user's patients / doctors row
+    (None for other roles), so routes don't have to look it up per request.
+    Implements the Flask-Login user protocol directly: UserMixin has no
+    __slots__, which would give every instance a __dict__ again.
+    """
+    __slots__ = ('id', 'username', 'role', 'fullname', 'patient_id', 'doctor_id')
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, username, role, fullname, patient_id=None, doctor_id=None):
         self.id = user_id
         self.username = username
         self.role = role
         self.fullname = fullname
+        self.patient_id = patient_id
+        self.doctor_id = doctor_id
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['username'], row['role'], row['fullname'],
+                   row['patient_id'], row['doctor_id'])
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    __hash__ = object.__hash__
+
+# Logged-in users by id, used by the Flask-Login user loader, as
+# (users_version, User) pairs. The triggers from migration 10 bump app_meta
+# 'users_version' whenever a user is edited, blacklisted or deleted, and an
+# entry is only trusted while it matches the stamp. The stamp is re-read at
+# most every USERS_VERSION_INTERVAL seconds per process, so a cache hit
+# usually costs no SQL at all and a change made by another worker process
+# applies within that interval. invalidate_user() drops the entry in this
+# process right away.
+USER_CACHE_SIZE = 4096
+USER_CACHE_TTL = 30.0
+USERS_VERSION_INTERVAL = 1.0
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+class UsersVersion:
+    """The app_meta 'users_version' stamp, read from the database at most every interval seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.checks = 0
+        self._stamp = None
+
+    def get(self, cursor):
+        now = time.monotonic()
+        stamp = self._stamp
+        if stamp is None or now - stamp[1] >= self.interval:
+            cursor.execute("SELECT value FROM app_meta WHERE key = 'users_version'")
+            row = cursor.fetchone()
+            stamp = self._stamp = (int(row[0]) if row else 0, now)
+            self.checks += 1
+        return stamp[0]
+
+    def reset(self):
+        self._stamp = None
+
+users_version = UsersVersion(USERS_VERSION_INTERVAL)
 
+def invalidate_user(user_id):
+    user_cache.invalidate(str(user_id))
@@ -0,0 +1,123 @@
+from departments import get_catalog
+
+# Read queries shared by several blueprints. Rows come back as slotted
+# objects built straight from the result tuples (no sqlite3.Row, no dict
+# copy); their fields are in SELECT order, and templates read them by
+# attribute just as they did the rows.
+
+
+class UpcomingAppointment:
+    __slots__ = ('id', 'appointment_date', 'appointment_time', 'status', 'doctor_name', 'department_id',
+                 'department')
+
+    def __init__(self, appointment_id, appointment_date, appointment_time, status, doctor_name, department_id,
+                 department=None):
+        self.id = appointment_id
+        self.appointment_date = appointment_date
+        self.appointment_time = appointment_time
+        self.status = status
+        self.doctor_name = doctor_name
+        self.department_id = department_id
+        self.department = department
+
+
+class Doctor:
+    __slots__ = ('id', 'fullname', 'specialization', 'experience_years', 'qualification', 'bio', 'department_id',
+                 'department')
+
+    def __init__(self, doctor_id, fullname, specialization, experience_years, qualification, bio, department_id,
+                 department=None):
+        self.id = doctor_id
+        self.fullname = fullname
+        self.specialization = specialization
+        self.experience_years = experience_years
+        self.qualification = qualification
+        self.bio = bio
+        self.department_id = department_id
+        self.department = department
+
+
+class PatientProfile:
+    __slots__ = ('id', 'fullname', 'email', 'phone', 'age', 'gender', 'address', 'blood_group')
+
+    def __init__(self, patient_id, fullname, email, phone, age, gender, address, blood_group):
+        self.id = patient_id
+        self.fullname = fullname
+        self.email = email
+        self.phone = phone
+        self.age = age
+        self.gender = gender
+        self.address = address
+        self.blood_group = blood_group
+
+
+UPCOMING_FOR_PATIENT_SQL = '''
+    SELECT a.id, a.appointment_date, a.appointment_time, a.status,
+           u.fullname as doctor_name, d.department_id
+    FROM appointments a
+    JOIN doctors d ON a.doctor_id = d.id
+    JOIN users u ON d.user_id = u.id
+    WHERE a.patient_id = ? AND a.status = "Booked"
+    ORDER BY a.appointment_date, a.appointment_time
+'''
+
+# Doctors patients may see and book: blacklisted ones are hidden
+DOCTOR_COLUMNS = '''
+    SELECT d.id, u.fullname, d.specialization, d.experience_years,
+           d.qualification, d.bio, d.department_id
+    FROM doctors d
+    JOIN users u ON d.user_id = u.id
+'''
+ACTIVE_DOCTOR_SQL = DOCTOR_COLUMNS + 'WHERE d.id = ? AND u.is_blacklisted = 0'
+DOCTORS_IN_DEPARTMENT_SQL = DOCTOR_COLUMNS + '''
+    WHERE d.department_id = ? AND u.is_blacklisted = 0
+    ORDER BY u.fullname
+'''
+
+# The patient's own profile page, the admin's edit form and the doctor's history header
+PATIENT_PROFILE_SQL = '''
+    SELECT p.id, u.fullname, u.email, u.phone, p.age, p.gender, p.address, p.blood_group
+    FROM patients p
+    JOIN users u ON p.user_id = u.id
+    WHERE p.id = ?
+'''
+
+
+def query(cursor, cls, sql, parameters=()):
+    """Run sql and return its rows as cls instances."""
+    # A cursor of its own, so the caller's keeps its row factory
+    rows = cursor.connection.cursor()
+    rows.row_factory = lambda _, row: cls(*row)
+    rows.execute(sql, parameters)
+    return rows.fetchall()
+
+
+def with_departments(cursor, rows, catalog=None):
+    """Fill in each row's department name from its department_id."""
+    catalog = catalog or get_catalog(cursor)
+    for row in rows:
+        row.department = catalog.name(row.department_id)
+    return rows
+
+
+def upcoming_for_patient(cursor, patient_id, catalog=None):
+    """A patient's Booked appointments, soonest first."""
+    rows = query(cursor, UpcomingAppointment, UPCOMING_FOR_PATIENT_SQL, (patient_id,))
+    return with_departments(cursor, rows, catalog)
+
+
+def active_doctor(cursor, doctor_id):
+    """A doctor that is not blacklisted, or None. department is left unset."""
+    rows = query(cursor, Doctor, ACTIVE_DOCTOR_SQL, (doctor_id,))
+    return rows[0] if rows else None
+
+
+def doctors_in_department(cursor, department_id):
+    """The department's doctors that are not blacklisted, by name."""
+    return query(cursor, Doctor, DOCTORS_IN_DEPARTMENT_SQL, (department_id,))
+
+
+def patient_profile(cursor, patient_id):
+    """A patient's contact and profile fields, or None."""
+    rows = query(cursor, PatientProfile, PATIENT_PROFILE_SQL, (patient_id,))
+    return rows[0] if rows else None
@@ -1,12 +1,111 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, get_template_attribute, Response, current_app
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import sqlite3
-from utils import role_required, get_db_connection
+from utils import role_required, get_db_connection, get_pool, decode_cursor, keyset_page
+from stats import read_counters
+from search import search_doctors, search_patients
+from models import invalidate_user, user_cache
+from departments import get_catalog
+from history import fetch_history, fetch_treatment, treatment_details, page_args
+from cache import page_cache
+from repository import patient_profile
+from exports import EXPORTS, FORMATS, stream_export, valid_status
+from imports import read_rows, file_format, import_users, count_passwords, ImportFileError
+from writer import write
+import metrics
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Admin dashboard lists are keyset-paginated; only the first page is rendered
+DASHBOARD_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+PAST_STATUSES = ('Completed', 'Cancelled', 'Expired')
+
+def page_limit():
+    limit = request.args.get('limit', DASHBOARD_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def fetch_doctors(cursor, after=None, limit=DASHBOARD_PAGE_SIZE):
+    keyset, params = '', []
+    if after:
+        # The >= lets SQLite seek the expression index; the row value breaks ties on id
+        keyset = "AND IFNULL(u.fullname, '') >= ? AND (IFNULL(u.fullname, ''), u.id) > (?, ?)"
+        params = [after[0], *after]
+    cursor.execute(f'''
+        SELECT d.id, u.id as user_id, u.fullname, IFNULL(u.fullname, '') as sort_name,
+               d.specialization, d.department_id, d.experience_years, u.is_blacklisted
+        FROM users u
+        JOIN doctors d ON d.user_id = u.id
+        WHERE u.role = 'doctor' {keyset}
+        ORDER BY IFNULL(u.fullname, ''), u.id
+        LIMIT ?
+    ''', [*params, limit + 1])
+    rows = cursor.fetchall()
+    rows = get_catalog(cursor).with_names(rows)
+    return keyset_page(rows, limit, lambda row: [row['sort_name'], row['user_id']])
+
+def fetch_patients(cursor, after=None, limit=DASHBOARD_PAGE_SIZE):
+    keyset, params = '', []
+    if after:
+        keyset = "AND IFNULL(u.fullname, '') >= ? AND (IFNULL(u.fullname, ''), u.id) > (?, ?)"
+        params = [after[0], *after]
+    cursor.execute(f'''
+        SELECT p.id, u.id as user_id, u.fullname, IFNULL(u.fullname, '') as sort_name,
+               u.email, u.phone, u.is_blacklisted
+        FROM users u
+        JOIN patients p ON p.user_id = u.id
+        WHERE u.role = 'patient' {keyset}
+        ORDER BY IFNULL(u.fullname, ''), u.id
+        LIMIT ?
+    ''', [*params, limit + 1])
+    return keyset_page(cursor.fetchall(), limit, lambda row: [row['sort_name'], row['user_id']])
+
+def appointment_key(row):
+    return [row['appointment_date'], row['appointment_time'], row['id']]
+
+def fetch_appointments_by_status(cursor, status, after, count, descending=False):
+    keyset, params = '', []
+    if after:
+        keyset = 'AND (a.appointment_date, a.appointment_time, a.id) {} (?, ?, ?)'.format('<' if descending else '>')
+        params = after
+    direction = 'DESC' if descending else 'ASC'
+    cursor.execute(f'''
+        SELECT a.id, u1.fullname as patient_name, u2.fullname as doctor_name, 
+               d.department_id, a.appointment_date, a.appointment_time, a.status
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN users u1 ON p.user_id = u1.id
+        JOIN doctors d ON a.doctor_id = d.id
+        JOIN users u2 ON d.user_id = u2.id
+        WHERE a.status = ? {keyset}
+        ORDER BY a.appointment_date {direction}, a.appointment_time {direction}, a.id {direction}
+        LIMIT ?
+    ''', [status, *params, count])
+    rows = cursor.fetchall()
+    return get_catalog(cursor).with_names(rows)
+
+def fetch_upcoming_appointments(cursor, after=None, limit=DASHBOARD_PAGE_SIZE):
+    rows = fetch_appointments_by_status(cursor, 'Booked', after, limit + 1)
+    return keyset_page(rows, limit, appointment_key)
+
+def fetch_past_appointments(cursor, after=None, limit=DASHBOARD_PAGE_SIZE):
+    # One index range per status, merged here, keeps the sort off the whole table
+    rows = []
+    for status in PAST_STATUSES:
+        rows.extend(fetch_appointments_by_status(cursor, status, after, limit + 1, descending=True))
+    rows.sort(key=appointment_key, reverse=True)
+    return keyset_page(rows[:limit + 1], limit, appointment_key)
+
+# section name -> (fetch function, cursor length, row macro)
+DASHBOARD_SECTIONS = {
+    'doctors': (fetch_doctors, 2, 'doctor_rows'),
+    'patients': (fetch_patients, 2, 'patient_rows'),
+    'upcoming': (fetch_upcoming_appointments, 3, 'appointment_rows'),
+    'past': (fetch_past_appointments, 3, 'appointment_rows'),
+}
+
 @admin_bp.route('/dashboard')
 @login_required
 @role_required('admin')
@@ -14,65 +113,17 @@ def dashboard():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get counts
-    cursor.execute('SELECT COUNT(*) FROM doctors')
-    doctor_count = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM patients')
-    patient_count = cursor.fetchone()[0]
+    # Get counts (trigger-maintained, see stats.py)
+    counts = read_counters(cursor, ('doctors', 'patients', 'appointments.status.Booked'))
+    doctor_count = counts['doctors']
+    patient_count = counts['patients']
+    appointment_count = counts['appointments.status.Booked']
     
-    cursor.execute('SELECT COUNT(*) FROM appointments WHERE status = "Booked"')
-    appointment_count = cursor.fetchone()[0]
-    
-    # Get doctors
-    cursor.execute('''
-        SELECT d.id, u.fullname, d.specialization, dept.name as department, d.experience_years, u.is_blacklisted
-        FROM doctors d
-        JOIN users u ON d.user_id = u.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        ORDER BY u.fullname
-    ''')
-    doctors = cursor.fetchall()
-    
-    # Get patients
-    cursor.execute('''
-        SELECT p.id, u.fullname, u.email, u.phone, u.is_blacklisted
-        FROM patients p
-        JOIN users u ON p.user_id = u.id
-        ORDER BY u.fullname
-    ''')
-    patients = cursor.fetchall()
-    
-    # Get upcoming appointments
-    cursor.execute('''
-        SELECT a.id, u1.fullname as patient_name, u2.fullname as doctor_name, 
-               dept.name as department, a.appointment_date, a.appointment_time, a.status
-        FROM appointments a
-        JOIN patients p ON a.patient_id = p.id
-        JOIN users u1 ON p.user_id = u1.id
-        JOIN doctors d ON a.doctor_id = d.id
-        JOIN users u2 ON d.user_id = u2.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE a.status = "Booked"
-        ORDER BY a.appointment_date, a.appointment_time
-    ''')
-    upcoming_appointments = cursor.fetchall()
-    
-    # Get past appointments (Completed and Cancelled)
-    cursor.execute('''
-        SELECT a.id, u1.fullname as patient_name, u2.fullname as doctor_name, 
-               dept.name as department, a.appointment_date, a.appointment_time, a.status
-        FROM appointments a
-        JOIN patients p ON a.patient_id = p.id
-        JOIN users u1 ON p.user_id = u1.id
-        JOIN doctors d ON a.doctor_id = d.id
-        JOIN users u2 ON d.user_id = u2.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE a.status IN ("Completed", "Cancelled")
-        ORDER BY a.appointment_date DESC, a.appointment_time DESC
-        LIMIT 50
-    ''')
-    past_appointments = cursor.fetchall()
+    # First page of each list; the rest is loaded by dashboard_page
+    doctors, next_doctors = fetch_doctors(cursor)
+    patients, next_patients = fetch_patients(cursor)
+    upcoming_appointments, next_upcoming = fetch_upcoming_appointments(cursor)
+    past_appointments, next_past = fetch_past_appointments(cursor)
     
     conn.close()
     
@@ -83,7 +134,30 @@ def dashboard():
                          doctors=doctors,
                          patients=patients,
                          upcoming_appointments=upcoming_appointments,
-                         past_appointments=past_appointments)
+                         past_appointments=past_appointments,
+                         next_doctors=next_doctors,
+                         next_patients=next_patients,
+                         next_upcoming=next_upcoming,
+                         next_past=next_past)
+
+@admin_bp.route('/dashboard/<section>')
+@login_required
+@role_required('admin')
+def dashboard_page(section):
+    if section not in DASHBOARD_SECTIONS:
+        abort(404)
+    fetch, cursor_size, macro = DASHBOARD_SECTIONS[section]
+    
+    after = request.args.get('after')
+    after = decode_cursor(after, cursor_size) if after else None
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    rows, next_cursor = fetch(cursor, after, page_limit())
+    conn.close()
+    
+    render_rows = get_template_attribute('admin/_dashboard_rows.html', macro)
+    return jsonify(html=str(render_rows(rows)), next=next_cursor)
 
 @admin_bp.route('/doctor/create', methods=['GET', 'POST'])
 @login_required
@@ -115,34 +189,79 @@ def create_doctor():
             conn.close()
             return redirect(url_for('admin.create_doctor'))
         
-        # Create user
+        conn.close()
+        
         hashed_password = generate_password_hash(password)
-        cursor.execute('''
-            INSERT INTO users (username, password, role, fullname, email, phone)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (username, hashed_password, 'doctor', fullname, email, phone))
-        user_id = cursor.lastrowid
         
-        # Create doctor record
-        cursor.execute('''
-            INSERT INTO doctors (user_id, specialization, department_id, experience_years, qualification, bio)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, specialization, department_id, experience_years, qualification, bio))
+        def create(cursor):
+            cursor.execute('''
+                INSERT INTO users (username, password, role, fullname, email, phone)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (username, hashed_password, 'doctor', fullname, email, phone))
+            cursor.execute('''
+                INSERT INTO doctors (user_id, specialization, department_id, experience_years, qualification, bio)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (cursor.lastrowid, specialization, department_id, experience_years, qualification, bio))
         
-        conn.commit()
-        conn.close()
+        write(create)
         
         flash('Doctor created successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
     
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT id, name FROM departments ORDER BY name')
-    departments = cursor.fetchall()
+    departments = get_catalog(cursor).departments
     conn.close()
     
     return render_template('admin/create_doctor.html', departments=departments)
 
+# Uploads are hashed inside the request, at about 150 ms per password per core,
+# so plaintext passwords are capped to stay well inside a worker's request
+# timeout; larger files go through `flask db import-users`
+IMPORT_MAX_ROWS = 1000
+IMPORT_MAX_PASSWORDS = 100
+
+@admin_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def import_users_page():
+    if request.method == 'POST':
+        role = request.form.get('role')
+        upload = request.files.get('file')
+        dry_run = bool(request.form.get('dry_run'))
+        
+        if role not in ('doctor', 'patient') or not upload or not upload.filename:
+            flash('Choose a role and a CSV or JSON file.', 'error')
+            return redirect(url_for('admin.import_users_page'))
+        
+        try:
+            rows = read_rows(upload.read(), file_format(upload.filename))
+        except (ImportFileError, UnicodeDecodeError) as e:
+            flash(f'Could not read {upload.filename}: {e}', 'error')
+            return redirect(url_for('admin.import_users_page'))
+        
+        max_rows = current_app.config.get('IMPORT_MAX_ROWS', IMPORT_MAX_ROWS)
+        if len(rows) > max_rows:
+            flash(f'Uploads are limited to {max_rows} rows; use `flask db import-users` for larger files.', 'error')
+            return redirect(url_for('admin.import_users_page'))
+        
+        max_passwords = current_app.config.get('IMPORT_MAX_PASSWORDS', IMPORT_MAX_PASSWORDS)
+        if not dry_run and count_passwords(rows) > max_passwords:
+            flash(f'Uploads may carry at most {max_passwords} plaintext passwords; supply password_hash '
+                  'instead or use `flask db import-users`.', 'error')
+            return redirect(url_for('admin.import_users_page'))
+        
+        # Validation and hashing run here; the insert is one write unit
+        conn = get_db_connection()
+        result = import_users(conn, role, rows, dry_run=dry_run, write=write)
+        conn.close()
+        
+        if result['imported']:
+            flash(f"Imported {result['imported']} {role}(s).", 'success')
+        return render_template('admin/import_users.html', result=result, role=role, dry_run=dry_run)
+    
+    return render_template('admin/import_users.html', result=None)
+
 @admin_bp.route('/doctor/<int:doctor_id>/edit', methods=['GET', 'POST'])
 @login_required
 @role_required('admin')
@@ -168,22 +287,21 @@ def edit_doctor(doctor_id):
             return redirect(url_for('admin.dashboard'))
         
         user_id = doctor['user_id']
+        conn.close()
         
-        # Update user
-        cursor.execute('''
-            UPDATE users SET fullname = ?, email = ?, phone = ?
-            WHERE id = ?
-        ''', (fullname, email, phone, user_id))
-        
-        # Update doctor
-        cursor.execute('''
-            UPDATE doctors SET specialization = ?, department_id = ?, 
-            experience_years = ?, qualification = ?, bio = ?
-            WHERE id = ?
-        ''', (specialization, department_id, experience_years, qualification, bio, doctor_id))
+        def update(cursor):
+            cursor.execute('''
+                UPDATE users SET fullname = ?, email = ?, phone = ?
+                WHERE id = ?
+            ''', (fullname, email, phone, user_id))
+            cursor.execute('''
+                UPDATE doctors SET specialization = ?, department_id = ?, 
+                experience_years = ?, qualification = ?, bio = ?
+                WHERE id = ?
+            ''', (specialization, department_id, experience_years, qualification, bio, doctor_id))
         
-        conn.commit()
-        conn.close()
+        write(update)
+        invalidate_user(user_id)
         
         flash('Doctor updated successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
@@ -198,8 +316,7 @@ def edit_doctor(doctor_id):
     ''', (doctor_id,))
     doctor = cursor.fetchone()
     
-    cursor.execute('SELECT id, name FROM departments ORDER BY name')
-    departments = cursor.fetchall()
+    departments = get_catalog(cursor).departments
     
     conn.close()
     
@@ -220,9 +337,12 @@ def delete_doctor(doctor_id):
     doctor = cursor.fetchone()
     
     if doctor:
-        cursor.execute('DELETE FROM doctors WHERE id = ?', (doctor_id,))
-        cursor.execute('DELETE FROM users WHERE id = ?', (doctor['user_id'],))
-        conn.commit()
+        def delete(cursor):
+            cursor.execute('DELETE FROM doctors WHERE id = ?', (doctor_id,))
+            cursor.execute('DELETE FROM users WHERE id = ?', (doctor['user_id'],))
+        
+        write(delete)
+        invalidate_user(doctor['user_id'])
         flash('Doctor deleted successfully!', 'success')
     else:
         flash('Doctor not found.', 'error')
@@ -241,8 +361,8 @@ def blacklist_doctor(doctor_id):
     doctor = cursor.fetchone()
     
     if doctor:
-        cursor.execute('UPDATE users SET is_blacklisted = 1 WHERE id = ?', (doctor['user_id'],))
-        conn.commit()
+        write(lambda cursor: cursor.execute('UPDATE users SET is_blacklisted = 1 WHERE id = ?', (doctor['user_id'],)).rowcount)
+        invalidate_user(doctor['user_id'])
         flash('Doctor blacklisted successfully!', 'success')
     else:
         flash('Doctor not found.', 'error')
@@ -274,33 +394,26 @@ def edit_patient(patient_id):
             return redirect(url_for('admin.dashboard'))
         
         user_id = patient['user_id']
+        conn.close()
         
-        # Update user
-        cursor.execute('''
-            UPDATE users SET fullname = ?, email = ?, phone = ?
-            WHERE id = ?
-        ''', (fullname, email, phone, user_id))
-        
-        # Update patient
-        cursor.execute('''
-            UPDATE patients SET age = ?, gender = ?, address = ?, blood_group = ?
-            WHERE id = ?
-        ''', (age, gender, address, blood_group, patient_id))
+        def update(cursor):
+            cursor.execute('''
+                UPDATE users SET fullname = ?, email = ?, phone = ?
+                WHERE id = ?
+            ''', (fullname, email, phone, user_id))
+            cursor.execute('''
+                UPDATE patients SET age = ?, gender = ?, address = ?, blood_group = ?
+                WHERE id = ?
+            ''', (age, gender, address, blood_group, patient_id))
         
-        conn.commit()
-        conn.close()
+        write(update)
+        invalidate_user(user_id)
         
         flash('Patient updated successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
     
     # GET request
-    cursor.execute('''
-        SELECT p.id, u.fullname, u.email, u.phone, p.age, p.gender, p.address, p.blood_group
-        FROM patients p
-        JOIN users u ON p.user_id = u.id
-        WHERE p.id = ?
-    ''', (patient_id,))
-    patient = cursor.fetchone()
+    patient = patient_profile(cursor, patient_id)
     
     conn.close()
     
@@ -321,8 +434,8 @@ def blacklist_patient(patient_id):
     patient = cursor.fetchone()
     
     if patient:
-        cursor.execute('UPDATE users SET is_blacklisted = 1 WHERE id = ?', (patient['user_id'],))
-        conn.commit()
+        write(lambda cursor: cursor.execute('UPDATE users SET is_blacklisted = 1 WHERE id = ?', (patient['user_id'],)).rowcount)
+        invalidate_user(patient['user_id'])
         flash('Patient blacklisted successfully!', 'success')
     else:
         flash('Patient not found.', 'error')
@@ -342,31 +455,27 @@ def search():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    search_term = f'%{query}%'
-    
-    # Search doctors
-    cursor.execute('''
-        SELECT d.id, u.fullname, d.specialization, dept.name as department
-        FROM doctors d
-        JOIN users u ON d.user_id = u.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE u.fullname LIKE ? OR d.specialization LIKE ? OR dept.name LIKE ?
-    ''', (search_term, search_term, search_term))
-    doctors = cursor.fetchall()
-    
-    # Search patients
-    cursor.execute('''
-        SELECT p.id, u.fullname, u.email, u.phone
-        FROM patients p
-        JOIN users u ON p.user_id = u.id
-        WHERE u.fullname LIKE ? OR u.email LIKE ? OR u.phone LIKE ?
-    ''', (search_term, search_term, search_term))
-    patients = cursor.fetchall()
+    # Full-text search, best matches first (see search.py)
+    doctors = search_doctors(cursor, query)
+    patients = search_patients(cursor, query)
     
     conn.close()
     
     return render_template('admin/search.html', query=query, doctors=doctors, patients=patients)
 
+@admin_bp.route('/metrics')
+@login_required
+@role_required('admin')
+def metrics_endpoint():
+    sweeper = current_app.extensions.get('expiry_sweeper')
+    writer = current_app.extensions.get('db_writer')
+    pools = {'read_write': get_pool().stats()}
+    if 'db_read_pool' in current_app.extensions:
+        pools['read_only'] = get_pool(readonly=True).stats()
+    text = metrics.render(pools, {'user': user_cache.stats(), 'page': page_cache.stats()},
+                          sweeper.stats() if sweeper else None, writer.stats() if writer else None)
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
 @admin_bp.route('/appointment/<int:appointment_id>/history')
 @login_required
 @role_required('admin')
@@ -375,35 +484,87 @@ def view_patient_history(appointment_id):
     cursor = conn.cursor()
     
     cursor.execute('''
-        SELECT a.id, u1.fullname as patient_name, u2.fullname as doctor_name, 
-               dept.name as department, a.appointment_date, a.appointment_time
+        SELECT a.id, a.patient_id, u1.fullname as patient_name, u2.fullname as doctor_name, 
+               d.department_id, a.appointment_date, a.appointment_time
         FROM appointments a
         JOIN patients p ON a.patient_id = p.id
         JOIN users u1 ON p.user_id = u1.id
         JOIN doctors d ON a.doctor_id = d.id
         JOIN users u2 ON d.user_id = u2.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
         WHERE a.id = ?
     ''', (appointment_id,))
     appointment = cursor.fetchone()
+    appointment = get_catalog(cursor).named(appointment)
     
     if not appointment:
         flash('Appointment not found.', 'error')
         conn.close()
         return redirect(url_for('admin.dashboard'))
     
-    # Get all treatments for this patient
-    cursor.execute('''
-        SELECT t.id, t.visit_type, t.tests_done, t.diagnosis, t.prescription, 
-               t.medicines, t.created_at, a.appointment_date
-        FROM treatments t
-        JOIN appointments a ON t.appointment_id = a.id
-        WHERE a.patient_id = (SELECT patient_id FROM appointments WHERE id = ?)
-        ORDER BY a.appointment_date DESC, t.created_at DESC
-    ''', (appointment_id,))
-    treatments = cursor.fetchall()
+    # First page of this patient's treatment summaries
+    treatments, next_cursor = fetch_history(cursor, appointment['patient_id'])
+    
+    conn.close()
+    
+    return render_template('admin/patient_history.html', appointment=appointment, treatments=treatments,
+                         next_cursor=next_cursor)
+
+@admin_bp.route('/appointment/<int:appointment_id>/history/page')
+@login_required
+@role_required('admin')
+def patient_history_page(appointment_id):
+    after, limit = page_args()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT patient_id FROM appointments WHERE id = ?', (appointment_id,))
+    appointment = cursor.fetchone()
+    if not appointment:
+        conn.close()
+        abort(404)
+    treatments, next_cursor = fetch_history(cursor, appointment['patient_id'], after, limit)
+    conn.close()
     
+    render_rows = get_template_attribute('_history_rows.html', 'history_rows')
+    return jsonify(html=str(render_rows(treatments, 'admin.treatment', True)), next=next_cursor)
+
+@admin_bp.route('/treatment/<int:treatment_id>')
+@login_required
+@role_required('admin')
+def treatment(treatment_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    row = fetch_treatment(cursor, treatment_id)
     conn.close()
     
-    return render_template('admin/patient_history.html', appointment=appointment, treatments=treatments)
+    if not row:
+        abort(404)
+    return jsonify(treatment_details(row))
 
+def export_date(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+@admin_bp.route('/export/<name>')
+@login_required
+@role_required('admin')
+def export(name):
+    fmt = request.args.get('format', 'csv')
+    if name not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    start, end = export_date('start'), export_date('end')
+    status = request.args.get('status') or None
+    if status and not valid_status(name, status):
+        abort(400)
+    
+    # Rows are read and encoded as the client downloads them (see exports.py)
+    chunks = stream_export(current_app.config['DATABASE'], name, fmt, start, end, status,
+                           archive_database=current_app.config['ARCHIVE_DATABASE'])
+    response = Response(chunks, mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={name}-{date.today().isoformat()}.{fmt}'
+    return response
@@ -2,8 +2,9 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
-from models import User
+from models import User, USER_COLUMNS, USER_JOINS
 from utils import get_db_connection
+from writer import write
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -27,10 +28,9 @@ def login():
         else:  # staff
             expected_roles = ['admin', 'doctor']
         
-        cursor.execute('''
-            SELECT id, username, password, role, fullname 
-            FROM users 
-            WHERE username = ? AND is_blacklisted = 0
+        cursor.execute(f'''
+            SELECT {USER_COLUMNS}, u.password {USER_JOINS}
+            WHERE u.username = ? AND u.is_blacklisted = 0
         ''', (username,))
         user_data = cursor.fetchone()
         conn.close()
@@ -46,7 +46,7 @@ def login():
             
             # Verify password
             if check_password_hash(user_data['password'], password):
-                user = User(user_data['id'], user_data['username'], user_data['role'], user_data['fullname'])
+                user = User.from_row(user_data)
                 login_user(user)
                 flash(f'Welcome back, {user.fullname or user.username}!', 'success')
                 
@@ -102,22 +102,22 @@ def register():
             conn.close()
             return render_template('auth/register.html')
         
+        conn.close()
+        
         # Create user (only patients can register)
         hashed_password = generate_password_hash(password)
-        cursor.execute('''
-            INSERT INTO users (username, password, role, fullname, email, phone)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (username, hashed_password, 'patient', fullname, email, phone))
-        user_id = cursor.lastrowid
-        
-        # Create patient record
-        cursor.execute('''
-            INSERT INTO patients (user_id)
-            VALUES (?)
-        ''', (user_id,))
-        
-        conn.commit()
-        conn.close()
+        
+        def create(cursor):
+            cursor.execute('''
+                INSERT INTO users (username, password, role, fullname, email, phone)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (username, hashed_password, 'patient', fullname, email, phone))
+            cursor.execute('''
+                INSERT INTO patients (user_id)
+                VALUES (?)
+            ''', (cursor.lastrowid,))
+        
+        write(create)
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('auth.login'))
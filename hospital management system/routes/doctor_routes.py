@@ -1,11 +1,38 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, get_template_attribute
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
 import sqlite3
-from utils import role_required, get_db_connection
+from utils import role_required, get_db_connection, decode_cursor, keyset_page
+from departments import get_catalog
+from history import fetch_history, fetch_treatment, treatment_details, page_args
+from writer import write
+from repository import patient_profile
 
 doctor_bp = Blueprint('doctor', __name__, url_prefix='/doctor')
 
+ROSTER_PAGE_SIZE = 25
+MAX_ROSTER_PAGE_SIZE = 100
+
+def roster_key(row):
+    return [row['last_visit'], row['id']]
+
+def fetch_roster(cursor, doctor_id, after=None, limit=ROSTER_PAGE_SIZE):
+    # Trigger-maintained roster (migration 7), most recently seen patients first
+    keyset, params = '', []
+    if after:
+        keyset = 'AND (r.last_visit, r.patient_id) < (?, ?)'
+        params = after
+    cursor.execute(f'''
+        SELECT p.id, u.fullname, u.email, r.first_visit, r.last_visit, r.visits
+        FROM doctor_patients r
+        JOIN patients p ON r.patient_id = p.id
+        JOIN users u ON p.user_id = u.id
+        WHERE r.doctor_id = ? {keyset}
+        ORDER BY r.last_visit DESC, r.patient_id DESC
+        LIMIT ?
+    ''', [doctor_id, *params, limit + 1])
+    return keyset_page(cursor.fetchall(), limit, roster_key)
+
 @doctor_bp.route('/dashboard')
 @login_required
 @role_required('doctor')
@@ -13,17 +40,14 @@ def dashboard():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get doctor ID
-    cursor.execute('SELECT id FROM doctors WHERE user_id = ?', (current_user.id,))
-    doctor = cursor.fetchone()
-    if not doctor:
+    if current_user.doctor_id is None:
         flash('Doctor profile not found.', 'error')
         conn.close()
         return redirect(url_for('auth.logout'))
     
-    doctor_id = doctor['id']
+    doctor_id = current_user.doctor_id
     
-    # Get upcoming appointments for today and this week
+    # Get upcoming appointments for this week; today's are a subset of them
     today = date.today()
     week_end = today + timedelta(days=7)
     cursor.execute('''
@@ -37,37 +61,37 @@ def dashboard():
         ORDER BY a.appointment_date, a.appointment_time
     ''', (doctor_id, today, week_end))
     appointments = cursor.fetchall()
+    today_appointments = [a for a in appointments if a['appointment_date'] == today.isoformat()]
     
-    # Also get today's appointments specifically
-    cursor.execute('''
-        SELECT a.id, a.appointment_date, a.appointment_time, a.status,
-               u.fullname as patient_name
-        FROM appointments a
-        JOIN patients p ON a.patient_id = p.id
-        JOIN users u ON p.user_id = u.id
-        WHERE a.doctor_id = ? AND a.status = "Booked" 
-        AND a.appointment_date = ?
-        ORDER BY a.appointment_time
-    ''', (doctor_id, today))
-    today_appointments = cursor.fetchall()
-    
-    # Get assigned patients (patients who have appointments)
-    cursor.execute('''
-        SELECT DISTINCT p.id, u.fullname, u.email
-        FROM patients p
-        JOIN users u ON p.user_id = u.id
-        JOIN appointments a ON a.patient_id = p.id
-        WHERE a.doctor_id = ?
-        ORDER BY u.fullname
-    ''', (doctor_id,))
-    patients = cursor.fetchall()
+    # First page of assigned patients; the rest is loaded by patients_page
+    patients, next_patients = fetch_roster(cursor, doctor_id)
     
     conn.close()
     
     return render_template('doctor/dashboard.html', 
                          appointments=appointments, 
                          today_appointments=today_appointments,
-                         patients=patients)
+                         patients=patients,
+                         next_patients=next_patients)
+
+@doctor_bp.route('/patients')
+@login_required
+@role_required('doctor')
+def patients_page():
+    if current_user.doctor_id is None:
+        abort(404)
+    after = request.args.get('after')
+    after = decode_cursor(after, 2) if after else None
+    limit = request.args.get('limit', ROSTER_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_ROSTER_PAGE_SIZE))
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    patients, next_patients = fetch_roster(cursor, current_user.doctor_id, after, limit)
+    conn.close()
+    
+    render_rows = get_template_attribute('doctor/_patient_rows.html', 'patient_rows')
+    return jsonify(html=str(render_rows(patients)), next=next_patients)
 
 @doctor_bp.route('/appointment/<int:appointment_id>/update', methods=['GET', 'POST'])
 @login_required
@@ -79,15 +103,15 @@ def update_patient_history(appointment_id):
     # Verify appointment belongs to this doctor
     cursor.execute('''
         SELECT a.id, a.patient_id, d.id as doctor_id, u.fullname as patient_name, 
-               dept.name as department
+               d.department_id
         FROM appointments a
         JOIN patients p ON a.patient_id = p.id
         JOIN users u ON p.user_id = u.id
         JOIN doctors d ON a.doctor_id = d.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE a.id = ? AND d.user_id = ?
-    ''', (appointment_id, current_user.id))
+        WHERE a.id = ? AND a.doctor_id = ?
+    ''', (appointment_id, current_user.doctor_id))
     appointment = cursor.fetchone()
+    appointment = get_catalog(cursor).named(appointment)
     
     if not appointment:
         flash('Appointment not found or access denied.', 'error')
@@ -102,26 +126,22 @@ def update_patient_history(appointment_id):
         medicines = request.form.get('medicines')
         notes = request.form.get('notes')
         
-        # Check if treatment already exists
-        cursor.execute('SELECT id FROM treatments WHERE appointment_id = ?', (appointment_id,))
-        treatment = cursor.fetchone()
+        conn.close()
         
-        if treatment:
-            # Update existing treatment
+        def save(cursor):
+            # Update the visit's treatment, or create it
             cursor.execute('''
                 UPDATE treatments SET visit_type = ?, tests_done = ?, diagnosis = ?,
                 prescription = ?, medicines = ?, notes = ?
                 WHERE appointment_id = ?
             ''', (visit_type, tests_done, diagnosis, prescription, medicines, notes, appointment_id))
-        else:
-            # Create new treatment
-            cursor.execute('''
-                INSERT INTO treatments (appointment_id, visit_type, tests_done, diagnosis, prescription, medicines, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (appointment_id, visit_type, tests_done, diagnosis, prescription, medicines, notes))
+            if not cursor.rowcount:
+                cursor.execute('''
+                    INSERT INTO treatments (appointment_id, visit_type, tests_done, diagnosis, prescription, medicines, notes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (appointment_id, visit_type, tests_done, diagnosis, prescription, medicines, notes))
         
-        conn.commit()
-        conn.close()
+        write(save)
         
         flash('Patient history updated successfully!', 'success')
         return redirect(url_for('doctor.dashboard'))
@@ -142,48 +162,38 @@ def update_patient_history(appointment_id):
 @login_required
 @role_required('doctor')
 def complete_appointment(appointment_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    doctor_id = current_user.doctor_id
     
-    # Verify appointment belongs to this doctor
-    cursor.execute('''
-        SELECT a.id FROM appointments a
-        JOIN doctors d ON a.doctor_id = d.id
-        WHERE a.id = ? AND d.user_id = ?
-    ''', (appointment_id, current_user.id))
+    # The doctor_id condition limits doctors to their own appointments
+    def complete(cursor):
+        cursor.execute('UPDATE appointments SET status = "Completed" WHERE id = ? AND doctor_id = ?',
+                       (appointment_id, doctor_id))
+        return cursor.rowcount
     
-    if cursor.fetchone():
-        cursor.execute('UPDATE appointments SET status = "Completed" WHERE id = ?', (appointment_id,))
-        conn.commit()
+    if write(complete):
         flash('Appointment marked as completed!', 'success')
     else:
         flash('Appointment not found or access denied.', 'error')
     
-    conn.close()
     return redirect(url_for('doctor.dashboard'))
 
 @doctor_bp.route('/appointment/<int:appointment_id>/cancel', methods=['POST'])
 @login_required
 @role_required('doctor')
 def cancel_appointment(appointment_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    doctor_id = current_user.doctor_id
     
-    # Verify appointment belongs to this doctor
-    cursor.execute('''
-        SELECT a.id FROM appointments a
-        JOIN doctors d ON a.doctor_id = d.id
-        WHERE a.id = ? AND d.user_id = ?
-    ''', (appointment_id, current_user.id))
+    # The doctor_id condition limits doctors to their own appointments
+    def cancel(cursor):
+        cursor.execute('UPDATE appointments SET status = "Cancelled" WHERE id = ? AND doctor_id = ?',
+                       (appointment_id, doctor_id))
+        return cursor.rowcount
     
-    if cursor.fetchone():
-        cursor.execute('UPDATE appointments SET status = "Cancelled" WHERE id = ?', (appointment_id,))
-        conn.commit()
+    if write(cancel):
         flash('Appointment cancelled!', 'success')
     else:
         flash('Appointment not found or access denied.', 'error')
     
-    conn.close()
     return redirect(url_for('doctor.dashboard'))
 
 @doctor_bp.route('/patient/<int:patient_id>/history')
@@ -193,43 +203,57 @@ def view_patient_history(patient_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Verify patient is assigned to this doctor
-    cursor.execute('SELECT id FROM doctors WHERE user_id = ?', (current_user.id,))
-    doctor = cursor.fetchone()
-    if not doctor:
+    if current_user.doctor_id is None:
         flash('Doctor profile not found.', 'error')
         conn.close()
         return redirect(url_for('doctor.dashboard'))
     
-    doctor_id = doctor['id']
+    doctor_id = current_user.doctor_id
     
-    cursor.execute('''
-        SELECT p.id, u.fullname
-        FROM patients p
-        JOIN users u ON p.user_id = u.id
-        WHERE p.id = ?
-    ''', (patient_id,))
-    patient = cursor.fetchone()
+    patient = patient_profile(cursor, patient_id)
     
     if not patient:
         flash('Patient not found.', 'error')
         conn.close()
         return redirect(url_for('doctor.dashboard'))
     
-    # Get all treatments for this patient with this doctor
-    cursor.execute('''
-        SELECT t.id, t.visit_type, t.tests_done, t.diagnosis, t.prescription, 
-               t.medicines, t.created_at, a.appointment_date
-        FROM treatments t
-        JOIN appointments a ON t.appointment_id = a.id
-        WHERE a.patient_id = ? AND a.doctor_id = ?
-        ORDER BY a.appointment_date DESC, t.created_at DESC
-    ''', (patient_id, doctor_id))
-    treatments = cursor.fetchall()
+    # First page of this patient's visits with this doctor
+    treatments, next_cursor = fetch_history(cursor, patient_id, doctor_id=doctor_id)
     
     conn.close()
     
-    return render_template('doctor/patient_history.html', patient=patient, treatments=treatments)
+    return render_template('doctor/patient_history.html', patient=patient, treatments=treatments,
+                         next_cursor=next_cursor)
+
+@doctor_bp.route('/patient/<int:patient_id>/history/page')
+@login_required
+@role_required('doctor')
+def patient_history_page(patient_id):
+    if current_user.doctor_id is None:
+        abort(404)
+    after, limit = page_args()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    treatments, next_cursor = fetch_history(cursor, patient_id, after, limit, doctor_id=current_user.doctor_id)
+    conn.close()
+    
+    render_rows = get_template_attribute('_history_rows.html', 'history_rows')
+    return jsonify(html=str(render_rows(treatments, 'doctor.treatment')), next=next_cursor)
+
+@doctor_bp.route('/treatment/<int:treatment_id>')
+@login_required
+@role_required('doctor')
+def treatment(treatment_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    row = fetch_treatment(cursor, treatment_id)
+    conn.close()
+    
+    # Doctors see the details of their own visits only, as on the history page
+    if not row or row['doctor_id'] != current_user.doctor_id:
+        abort(404)
+    return jsonify(treatment_details(row))
 
 @doctor_bp.route('/availability', methods=['GET', 'POST'])
 @login_required
@@ -238,27 +262,19 @@ def availability():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT id FROM doctors WHERE user_id = ?', (current_user.id,))
-    doctor = cursor.fetchone()
-    if not doctor:
+    if current_user.doctor_id is None:
         flash('Doctor profile not found.', 'error')
         conn.close()
         return redirect(url_for('doctor.dashboard'))
     
-    doctor_id = doctor['id']
+    doctor_id = current_user.doctor_id
     
     if request.method == 'POST':
         # Get availability for next 7 days
         today = date.today()
         
-        # Delete existing availability for next 7 days
         end_date = today + timedelta(days=7)
-        cursor.execute('''
-            DELETE FROM doctor_availability 
-            WHERE doctor_id = ? AND date >= ? AND date <= ?
-        ''', (doctor_id, today, end_date))
-        
-        # Insert new availability
+        rows = []
         for i in range(7):
             day = today + timedelta(days=i)
             morning_start = request.form.get(f'morning_start_{i}')
@@ -267,14 +283,22 @@ def availability():
             evening_end = request.form.get(f'evening_end_{i}')
             
             if morning_start and morning_end:
-                cursor.execute('''
-                    INSERT INTO doctor_availability (doctor_id, date, morning_start, morning_end, evening_start, evening_end)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (doctor_id, day, morning_start, morning_end, evening_start, evening_end))
-        
-        conn.commit()
+                rows.append((doctor_id, day, morning_start, morning_end, evening_start, evening_end))
         conn.close()
         
+        # Replace the availability for the next 7 days
+        def replace(cursor):
+            cursor.execute('''
+                DELETE FROM doctor_availability 
+                WHERE doctor_id = ? AND date >= ? AND date <= ?
+            ''', (doctor_id, today, end_date))
+            cursor.executemany('''
+                INSERT INTO doctor_availability (doctor_id, date, morning_start, morning_end, evening_start, evening_end)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+        
+        write(replace)
+        
         flash('Availability updated successfully!', 'success')
         return redirect(url_for('doctor.dashboard'))
     
@@ -1,11 +1,40 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app, get_template_attribute
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
 import sqlite3
 from utils import role_required, get_db_connection
+from search import search_doctors
+from models import invalidate_user
+from departments import get_catalog
+from history import fetch_history, fetch_treatment, treatment_details, page_args
+from slots import get_free_slots, slot_grid, to_hhmm, MAX_DAYS, SLOT_MINUTES
+from writer import write
+from repository import upcoming_for_patient, active_doctor, doctors_in_department, with_departments, patient_profile
 
 patient_bp = Blueprint('patient', __name__, url_prefix='/patient')
 
+# How SQLite reports a uq_appointments_booked_slot conflict (migration 5)
+BOOKED_SLOT_CONFLICT = ('UNIQUE constraint failed: appointments.doctor_id, '
+                        'appointments.appointment_date, appointments.appointment_time')
+
+def book_appointment(patient_id, doctor_id, appointment_date, appointment_time):
+    """Reserve a slot atomically. Returns False if the slot is already booked.
+
+    Any other integrity error (e.g. a missing patient_id) is raised.
+    """
+    def insert(cursor):
+        cursor.execute('''
+            INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status)
+            VALUES (?, ?, ?, ?, 'Booked')
+        ''', (patient_id, doctor_id, appointment_date, appointment_time))
+    try:
+        write(insert)
+    except sqlite3.IntegrityError as e:
+        if str(e) != BOOKED_SLOT_CONFLICT:
+            raise
+        return False
+    return True
+
 @patient_bp.route('/dashboard')
 @login_required
 @role_required('patient')
@@ -13,32 +42,18 @@ def dashboard():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get patient ID
-    cursor.execute('SELECT id FROM patients WHERE user_id = ?', (current_user.id,))
-    patient = cursor.fetchone()
-    if not patient:
+    if current_user.patient_id is None:
         flash('Patient profile not found.', 'error')
         conn.close()
         return redirect(url_for('auth.logout'))
     
-    patient_id = patient['id']
+    patient_id = current_user.patient_id
     
     # Get departments
-    cursor.execute('SELECT id, name, description FROM departments ORDER BY name')
-    departments = cursor.fetchall()
-    
-    # Get upcoming appointments
-    cursor.execute('''
-        SELECT a.id, a.appointment_date, a.appointment_time, a.status,
-               u.fullname as doctor_name, dept.name as department
-        FROM appointments a
-        JOIN doctors d ON a.doctor_id = d.id
-        JOIN users u ON d.user_id = u.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE a.patient_id = ? AND a.status = "Booked"
-        ORDER BY a.appointment_date, a.appointment_time
-    ''', (patient_id,))
-    upcoming_appointments = cursor.fetchall()
+    catalog = get_catalog(cursor)
+    departments = catalog.departments
+    
+    upcoming_appointments = upcoming_for_patient(cursor, patient_id, catalog)
     
     conn.close()
     
@@ -53,24 +68,14 @@ def view_department(department_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT id, name, description FROM departments WHERE id = ?', (department_id,))
-    department = cursor.fetchone()
+    department = get_catalog(cursor).by_id.get(department_id)
     
     if not department:
         flash('Department not found.', 'error')
         conn.close()
         return redirect(url_for('patient.dashboard'))
     
-    # Get doctors in this department
-    cursor.execute('''
-        SELECT d.id, u.fullname, d.specialization, d.experience_years, 
-               d.qualification, d.bio
-        FROM doctors d
-        JOIN users u ON d.user_id = u.id
-        WHERE d.department_id = ? AND u.is_blacklisted = 0
-        ORDER BY u.fullname
-    ''', (department_id,))
-    doctors = cursor.fetchall()
+    doctors = doctors_in_department(cursor, department_id)
     
     conn.close()
     
@@ -83,21 +88,15 @@ def view_doctor(doctor_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT d.id, u.fullname, d.specialization, d.experience_years, 
-               d.qualification, d.bio, dept.name as department
-        FROM doctors d
-        JOIN users u ON d.user_id = u.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE d.id = ? AND u.is_blacklisted = 0
-    ''', (doctor_id,))
-    doctor = cursor.fetchone()
+    doctor = active_doctor(cursor, doctor_id)
     
     if not doctor:
         flash('Doctor not found.', 'error')
         conn.close()
         return redirect(url_for('patient.dashboard'))
     
+    with_departments(cursor, [doctor])
+    
     conn.close()
     
     return render_template('patient/doctor_profile.html', doctor=doctor)
@@ -109,43 +108,20 @@ def check_availability(doctor_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT d.id, u.fullname, d.specialization
-        FROM doctors d
-        JOIN users u ON d.user_id = u.id
-        WHERE d.id = ? AND u.is_blacklisted = 0
-    ''', (doctor_id,))
-    doctor = cursor.fetchone()
+    doctor = active_doctor(cursor, doctor_id)
     
     if not doctor:
         flash('Doctor not found.', 'error')
         conn.close()
         return redirect(url_for('patient.dashboard'))
     
-    # Get patient ID
-    cursor.execute('SELECT id FROM patients WHERE user_id = ?', (current_user.id,))
-    patient = cursor.fetchone()
-    patient_id = patient['id']
+    patient_id = current_user.patient_id
     
-    # Get availability for next 7 days
+    # Free slots for the next 7 days only (see slots.py)
     today = date.today()
-    dates = [(today + timedelta(days=i)) for i in range(7)]
-    
-    cursor.execute('''
-        SELECT date, morning_start, morning_end, evening_start, evening_end
-        FROM doctor_availability
-        WHERE doctor_id = ? AND date >= ? AND date <= ?
-        ORDER BY date
-    ''', (doctor_id, today, today + timedelta(days=7)))
-    availability = {str(row['date']): row for row in cursor.fetchall()}
-    
-    # Get existing appointments for this doctor
-    cursor.execute('''
-        SELECT appointment_date, appointment_time
-        FROM appointments
-        WHERE doctor_id = ? AND status = "Booked"
-    ''', (doctor_id,))
-    booked_slots = [[str(row['appointment_date']), row['appointment_time']] for row in cursor.fetchall()]
+    dates = [(today + timedelta(days=i)) for i in range(MAX_DAYS)]
+    slot_minutes = current_app.config.get('SLOT_MINUTES', SLOT_MINUTES)
+    availability, free_slots = get_free_slots(cursor, doctor_id, today, MAX_DAYS, slot_minutes)
     
     if request.method == 'POST':
         appointment_date = request.form.get('appointment_date')
@@ -153,94 +129,69 @@ def check_availability(doctor_id):
         
         if not appointment_date or not appointment_time:
             flash('Please select a date and time.', 'error')
-            conn.close()
-            return render_template('patient/availability.html', 
-                                 doctor=doctor, dates=dates, 
-                                 availability=availability, booked_slots=booked_slots)
-        
-        # Check if slot is already booked
-        is_booked = any(slot[0] == appointment_date and slot[1] == appointment_time for slot in booked_slots)
-        if is_booked:
-            flash('This time slot is already booked. Please choose another.', 'error')
-            conn.close()
-            return render_template('patient/availability.html', 
-                                 doctor=doctor, dates=dates, 
-                                 availability=availability, booked_slots=booked_slots)
-        
-        # Check if slot is in doctor's availability
-        appointment_date_obj = datetime.strptime(appointment_date, '%Y-%m-%d').date()
-        if appointment_date in availability:
-            avail = availability[appointment_date]
-            time_obj = datetime.strptime(appointment_time, '%H:%M').time()
-            
-            is_available = False
-            if avail['morning_start'] and avail['morning_end']:
-                morning_start = datetime.strptime(avail['morning_start'], '%H:%M').time()
-                morning_end = datetime.strptime(avail['morning_end'], '%H:%M').time()
-                if morning_start <= time_obj <= morning_end:
-                    is_available = True
-            
-            if not is_available and avail['evening_start'] and avail['evening_end']:
-                evening_start = datetime.strptime(avail['evening_start'], '%H:%M').time()
-                evening_end = datetime.strptime(avail['evening_end'], '%H:%M').time()
-                if evening_start <= time_obj <= evening_end:
-                    is_available = True
-            
-            if not is_available:
+        elif appointment_date not in availability:
+            flash('Doctor is not available on this date.', 'error')
+        elif appointment_time not in free_slots[appointment_date]:
+            grid = slot_grid(availability[appointment_date], slot_minutes)
+            if appointment_time in [to_hhmm(start) for start in grid]:
+                flash('This time slot is already booked. Please choose another.', 'error')
+            else:
                 flash('Selected time is not in doctor\'s availability.', 'error')
-                conn.close()
-                return render_template('patient/availability.html', 
-                                     doctor=doctor, dates=dates, 
-                                     availability=availability, booked_slots=booked_slots)
+        # Create appointment; the unique slot index decides between concurrent requests
+        elif not book_appointment(patient_id, doctor_id, appointment_date, appointment_time):
+            flash('This time slot is already booked. Please choose another.', 'error')
+            availability, free_slots = get_free_slots(cursor, doctor_id, today, MAX_DAYS, slot_minutes)
         else:
-            flash('Doctor is not available on this date.', 'error')
             conn.close()
-            return render_template('patient/availability.html', 
-                                 doctor=doctor, dates=dates, 
-                                 availability=availability, booked_slots=booked_slots)
-        
-        # Create appointment
-        cursor.execute('''
-            INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status)
-            VALUES (?, ?, ?, ?, "Booked")
-        ''', (patient_id, doctor_id, appointment_date, appointment_time))
-        
-        conn.commit()
-        conn.close()
-        
-        flash('Appointment booked successfully!', 'success')
-        return redirect(url_for('patient.dashboard'))
+            flash('Appointment booked successfully!', 'success')
+            return redirect(url_for('patient.dashboard'))
     
     conn.close()
     
     return render_template('patient/availability.html', 
                          doctor=doctor, dates=dates, 
-                         availability=availability, booked_slots=booked_slots)
+                         availability=availability, free_slots=free_slots)
 
-@patient_bp.route('/appointment/<int:appointment_id>/cancel', methods=['POST'])
+@patient_bp.route('/doctor/<int:doctor_id>/slots')
 @login_required
 @role_required('patient')
-def cancel_appointment(appointment_id):
+def doctor_slots(doctor_id):
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else date.today()
+    except ValueError:
+        abort(400)
+    days = request.args.get('days', MAX_DAYS, type=int)
+    slot_minutes = current_app.config.get('SLOT_MINUTES', SLOT_MINUTES)
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get patient ID
-    cursor.execute('SELECT id FROM patients WHERE user_id = ?', (current_user.id,))
-    patient = cursor.fetchone()
-    patient_id = patient['id']
+    if not active_doctor(cursor, doctor_id):
+        conn.close()
+        abort(404)
+    
+    availability, free_slots = get_free_slots(cursor, doctor_id, start, days, slot_minutes)
+    conn.close()
+    
+    return jsonify(doctor_id=doctor_id, slot_minutes=slot_minutes, slots=free_slots)
+
+@patient_bp.route('/appointment/<int:appointment_id>/cancel', methods=['POST'])
+@login_required
+@role_required('patient')
+def cancel_appointment(appointment_id):
+    patient_id = current_user.patient_id
     
-    # Verify appointment belongs to this patient
-    cursor.execute('SELECT id FROM appointments WHERE id = ? AND patient_id = ?', 
-                   (appointment_id, patient_id))
+    # The patient_id condition limits patients to their own appointments
+    def cancel(cursor):
+        cursor.execute('UPDATE appointments SET status = "Cancelled" WHERE id = ? AND patient_id = ?',
+                       (appointment_id, patient_id))
+        return cursor.rowcount
     
-    if cursor.fetchone():
-        cursor.execute('UPDATE appointments SET status = "Cancelled" WHERE id = ?', (appointment_id,))
-        conn.commit()
+    if write(cancel):
         flash('Appointment cancelled successfully!', 'success')
     else:
         flash('Appointment not found or access denied.', 'error')
     
-    conn.close()
     return redirect(url_for('patient.dashboard'))
 
 @patient_bp.route('/history')
@@ -250,29 +201,39 @@ def history():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get patient ID
-    cursor.execute('SELECT id FROM patients WHERE user_id = ?', (current_user.id,))
-    patient = cursor.fetchone()
-    patient_id = patient['id']
-    
-    # Get all treatments
-    cursor.execute('''
-        SELECT t.id, t.visit_type, t.tests_done, t.diagnosis, t.prescription, 
-               t.medicines, t.created_at, a.appointment_date,
-               u.fullname as doctor_name, dept.name as department
-        FROM treatments t
-        JOIN appointments a ON t.appointment_id = a.id
-        JOIN doctors d ON a.doctor_id = d.id
-        JOIN users u ON d.user_id = u.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE a.patient_id = ?
-        ORDER BY a.appointment_date DESC, t.created_at DESC
-    ''', (patient_id,))
-    treatments = cursor.fetchall()
+    # First page of treatment summaries; history_page and treatment load the rest
+    treatments, next_cursor = fetch_history(cursor, current_user.patient_id)
+    
+    conn.close()
+    
+    return render_template('patient/history.html', treatments=treatments, next_cursor=next_cursor)
+
+@patient_bp.route('/history/page')
+@login_required
+@role_required('patient')
+def history_page():
+    after, limit = page_args()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    treatments, next_cursor = fetch_history(cursor, current_user.patient_id, after, limit)
+    conn.close()
     
+    render_rows = get_template_attribute('_history_rows.html', 'history_rows')
+    return jsonify(html=str(render_rows(treatments, 'patient.treatment', True)), next=next_cursor)
+
+@patient_bp.route('/treatment/<int:treatment_id>')
+@login_required
+@role_required('patient')
+def treatment(treatment_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    row = fetch_treatment(cursor, treatment_id)
     conn.close()
     
-    return render_template('patient/history.html', treatments=treatments)
+    if not row or row['patient_id'] != current_user.patient_id:
+        abort(404)
+    return jsonify(treatment_details(row))
 
 @patient_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -281,9 +242,7 @@ def profile():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT id FROM patients WHERE user_id = ?', (current_user.id,))
-    patient = cursor.fetchone()
-    patient_id = patient['id']
+    patient_id = current_user.patient_id
     
     if request.method == 'POST':
         fullname = request.form.get('fullname')
@@ -294,32 +253,27 @@ def profile():
         address = request.form.get('address')
         blood_group = request.form.get('blood_group')
         
-        # Update user
-        cursor.execute('''
-            UPDATE users SET fullname = ?, email = ?, phone = ?
-            WHERE id = ?
-        ''', (fullname, email, phone, current_user.id))
+        user_id = current_user.id
+        conn.close()
         
-        # Update patient
-        cursor.execute('''
-            UPDATE patients SET age = ?, gender = ?, address = ?, blood_group = ?
-            WHERE id = ?
-        ''', (age, gender, address, blood_group, patient_id))
+        def update(cursor):
+            cursor.execute('''
+                UPDATE users SET fullname = ?, email = ?, phone = ?
+                WHERE id = ?
+            ''', (fullname, email, phone, user_id))
+            cursor.execute('''
+                UPDATE patients SET age = ?, gender = ?, address = ?, blood_group = ?
+                WHERE id = ?
+            ''', (age, gender, address, blood_group, patient_id))
         
-        conn.commit()
-        conn.close()
+        write(update)
+        invalidate_user(user_id)
         
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('patient.profile'))
     
     # GET request
-    cursor.execute('''
-        SELECT u.fullname, u.email, u.phone, p.age, p.gender, p.address, p.blood_group
-        FROM patients p
-        JOIN users u ON p.user_id = u.id
-        WHERE p.id = ?
-    ''', (patient_id,))
-    profile_data = cursor.fetchone()
+    profile_data = patient_profile(cursor, patient_id)
     
     conn.close()
     
@@ -337,18 +291,8 @@ def search():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    search_term = f'%{query}%'
-    
-    # Search doctors
-    cursor.execute('''
-        SELECT d.id, u.fullname, d.specialization, dept.name as department
-        FROM doctors d
-        JOIN users u ON d.user_id = u.id
-        LEFT JOIN departments dept ON d.department_id = dept.id
-        WHERE (u.fullname LIKE ? OR d.specialization LIKE ? OR dept.name LIKE ?) 
-        AND u.is_blacklisted = 0
-    ''', (search_term, search_term, search_term))
-    doctors = cursor.fetchall()
+    # Full-text search over active doctors, best matches first
+    doctors = search_doctors(cursor, query, include_blacklisted=False)
     
     conn.close()
     
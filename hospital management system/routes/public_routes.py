@@ -1,10 +1,14 @@
 from flask import Blueprint, render_template
 from flask_login import current_user
 from utils import get_db_connection
+from cache import cached_page
+from departments import get_catalog
+from repository import upcoming_for_patient
 
 public_bp = Blueprint('public', __name__)
 
 @public_bp.route('/')
+@cached_page('public/index.html', 'public_base.html')
 def index():
     pending_appointments = None
     
@@ -13,25 +17,7 @@ def index():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Get patient ID
-        cursor.execute('SELECT id FROM patients WHERE user_id = ?', (current_user.id,))
-        patient = cursor.fetchone()
-        
-        if patient:
-            patient_id = patient['id']
-            
-            # Get upcoming appointments
-            cursor.execute('''
-                SELECT a.id, a.appointment_date, a.appointment_time, a.status,
-                       u.fullname as doctor_name, dept.name as department
-                FROM appointments a
-                JOIN doctors d ON a.doctor_id = d.id
-                JOIN users u ON d.user_id = u.id
-                LEFT JOIN departments dept ON d.department_id = dept.id
-                WHERE a.patient_id = ? AND a.status = "Booked"
-                ORDER BY a.appointment_date, a.appointment_time
-            ''', (patient_id,))
-            pending_appointments = cursor.fetchall()
+        pending_appointments = upcoming_for_patient(cursor, current_user.patient_id)
         
         conn.close()
     
@@ -41,12 +27,12 @@ def index():
 def departments():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT id, name, description FROM departments ORDER BY name')
-    departments = cursor.fetchall()
+    departments = get_catalog(cursor).departments
     conn.close()
     return render_template('public/departments.html', departments=departments)
 
 @public_bp.route('/treatments')
+@cached_page('public/treatments.html', 'public_base.html')
 def treatments():
     treatments = [
         {
@@ -119,6 +105,7 @@ def treatments():
     return render_template('public/treatments.html', treatments=treatments)
 
 @public_bp.route('/success')
+@cached_page('public/success_stories.html', 'public_base.html')
 def success_stories():
     stories = [
         {
@@ -188,14 +175,17 @@ def success_stories():
     return render_template('public/success_stories.html', stories=stories)
 
 @public_bp.route('/about')
+@cached_page('public/about.html', 'public_base.html')
 def about():
     return render_template('public/about.html')
 
 @public_bp.route('/contact')
+@cached_page('public/contact.html', 'public_base.html')
 def contact():
     return render_template('public/contact.html')
 
 @public_bp.route('/blog')
+@cached_page('public/blog.html', 'public_base.html')
 def blog():
     blogs = [
         {
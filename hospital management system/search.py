@@ -0,0 +1,38 @@
+import re
+
+# Full-text search over the doctor_search / patient_search FTS5 tables (migration 4)
+SEARCH_LIMIT = 50
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 MATCH expression of prefix terms, or None."""
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def ranked_search(cursor, table, columns, text, extra_filter='', limit=SEARCH_LIMIT):
+    match = fts_query(text)
+    if match is None:
+        return []
+
+    # bm25 ranks every match; the LIMIT keeps the sort to the best `limit` rows
+    cursor.execute(f'''
+        SELECT rowid as id, {columns}
+        FROM {table}
+        WHERE {table} MATCH ? {extra_filter}
+        ORDER BY rank
+        LIMIT ?
+    ''', (match, limit))
+    return cursor.fetchall()
+
+
+def search_doctors(cursor, text, include_blacklisted=True, limit=SEARCH_LIMIT):
+    extra_filter = '' if include_blacklisted else 'AND blacklisted = 0'
+    return ranked_search(cursor, 'doctor_search', 'fullname, specialization, department',
+                         text, extra_filter, limit)
+
+
+def search_patients(cursor, text, limit=SEARCH_LIMIT):
+    return ranked_search(cursor, 'patient_search', 'fullname, email, phone', text, limit=limit)
@@ -0,0 +1,73 @@
+from bisect import bisect_left
+from datetime import timedelta
+
+# Free-slot computation for patient booking: doctor_availability windows minus
+# booked appointments, for a bounded date range only.
+SLOT_MINUTES = 30
+MAX_DAYS = 7
+
+
+def to_minutes(value):
+    hours, minutes = value.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def to_hhmm(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def windows(avail):
+    """(start, end) minute pairs of a doctor_availability row's morning/evening sessions."""
+    for start, end in (('morning_start', 'morning_end'), ('evening_start', 'evening_end')):
+        if avail[start] and avail[end]:
+            yield to_minutes(avail[start]), to_minutes(avail[end])
+
+
+def slot_grid(avail, slot_minutes=SLOT_MINUTES):
+    """Every slot start that fits entirely inside the day's windows."""
+    grid = []
+    for start, end in windows(avail):
+        grid.extend(range(start, end - slot_minutes + 1, slot_minutes))
+    return grid
+
+
+def free_slots_for_day(avail, booked_times, slot_minutes=SLOT_MINUTES):
+    # A slot is free when no booked appointment [b, b + slot) overlaps [t, t + slot)
+    taken = sorted(to_minutes(t) for t in booked_times)
+    free = []
+    for start in slot_grid(avail, slot_minutes):
+        i = bisect_left(taken, start - slot_minutes + 1)
+        if i == len(taken) or taken[i] >= start + slot_minutes:
+            free.append(to_hhmm(start))
+    return free
+
+
+def get_free_slots(cursor, doctor_id, start, days=MAX_DAYS, slot_minutes=SLOT_MINUTES):
+    """Availability and free slots for doctor_id over [start, start + days).
+
+    Returns ({date_str: availability dict}, {date_str: [HH:MM, ...]}).
+    """
+    days = max(1, min(days, MAX_DAYS))
+    end = start + timedelta(days=days - 1)
+
+    cursor.execute('''
+        SELECT date, morning_start, morning_end, evening_start, evening_end
+        FROM doctor_availability
+        WHERE doctor_id = ? AND date >= ? AND date <= ?
+        ORDER BY date
+    ''', (doctor_id, start, end))
+    availability = {str(row['date']): dict(row) for row in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT appointment_date, appointment_time
+        FROM appointments
+        WHERE doctor_id = ? AND status = 'Booked'
+        AND appointment_date >= ? AND appointment_date <= ?
+    ''', (doctor_id, start, end))
+    booked = {}
+    for row in cursor.fetchall():
+        booked.setdefault(str(row['appointment_date']), []).append(row['appointment_time'])
+
+    free = {day: free_slots_for_day(avail, booked.get(day, ()), slot_minutes)
+            for day, avail in availability.items()}
+    return availability, free
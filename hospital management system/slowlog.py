@@ -0,0 +1,123 @@
+import glob
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+# Opt-in slow-query log. InstrumentedCursor (utils.py) calls record() once a
+# statement's execute + fetch time passes `threshold` seconds; None disables it.
+# Entries are JSON lines in a rotating file; parameters are logged by type only.
+threshold = None
+
+logger = logging.getLogger('hms.slow_queries')
+logger.propagate = False
+
+_explained = set()
+_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL with literals replaced by ? and whitespace collapsed, for grouping."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def params_shape(parameters):
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+def explain(conn, sql, parameters):
+    """EXPLAIN QUERY PLAN detail lines, or None if the statement can't be explained."""
+    try:
+        # A plain cursor, so the EXPLAIN is neither counted nor traced itself
+        cursor = conn.cursor(sqlite3.Cursor)
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+        return [row[3] for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return None
+
+
+def record(conn, sql, parameters, duration, many=False):
+    normalized = normalize(sql)
+    entry = {
+        'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'route': request.endpoint if has_request_context() else None,
+        'duration_ms': round(duration * 1000, 3),
+        'sql': normalized,
+        'params': 'executemany' if many else params_shape(parameters),
+    }
+
+    with _lock:
+        first = normalized not in _explained
+        _explained.add(normalized)
+    if first and not many:
+        plan = explain(conn, sql, parameters)
+        entry['plan'] = plan
+        entry['scans'] = [step for step in plan or () if step.startswith('SCAN')]
+
+    logger.warning(json.dumps(entry))
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_QUERY_MS', None)
+    app.config.setdefault('SLOW_QUERY_LOG', 'slow_queries.jsonl')
+    app.config.setdefault('SLOW_QUERY_LOG_BYTES', 5 * 1024 * 1024)
+    app.config.setdefault('SLOW_QUERY_LOG_BACKUPS', 3)
+
+    global threshold
+    if app.config['SLOW_QUERY_MS'] is None:
+        threshold = None
+        return
+    threshold = float(app.config['SLOW_QUERY_MS']) / 1000
+    if not logger.handlers:
+        handler = RotatingFileHandler(app.config['SLOW_QUERY_LOG'],
+                                      maxBytes=app.config['SLOW_QUERY_LOG_BYTES'],
+                                      backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'])
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+
+
+def read_entries(path):
+    """Entries from the log and its rotated backups, oldest file first."""
+    backups = [name for name in glob.glob(glob.escape(path) + '.*') if name.rsplit('.', 1)[1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit('.', 1)[1]), reverse=True)
+    for name in [*backups, path]:
+        try:
+            with open(name) as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def summarize(entries):
+    """Group entries by normalized SQL; slowest total time first."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'routes': set(), 'scans': [],
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['routes'].add(entry.get('route') or '-')
+        if entry.get('scans'):
+            group['scans'] = entry['scans']
+    return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
@@ -0,0 +1,70 @@
+import archive
+
+# Dashboard counters kept exact by the triggers in migration 3.
+# Names: 'doctors', 'patients', 'appointments.status.<status>',
+# 'appointments.department.<department_id or none>'.
+# The doctor_patients roster (migration 7) is trigger-maintained the same way.
+# Counters cover the hot tables only; archived appointments drop out of them.
+
+EXPECTED_COUNTERS_SQL = '''
+    SELECT 'doctors', COUNT(*) FROM doctors
+    UNION ALL
+    SELECT 'patients', COUNT(*) FROM patients
+    UNION ALL
+    SELECT 'appointments.status.' || IFNULL(status, ''), COUNT(*)
+    FROM appointments GROUP BY 1
+    UNION ALL
+    SELECT 'appointments.department.' || IFNULL(d.department_id, 'none'), COUNT(*)
+    FROM appointments a LEFT JOIN doctors d ON a.doctor_id = d.id GROUP BY 1
+'''
+
+
+def read_counters(cursor, names):
+    """Return {name: value} for the given counters, 0 for ones never touched."""
+    placeholders = ', '.join('?' for _ in names)
+    cursor.execute(f'SELECT name, value FROM stats_counters WHERE name IN ({placeholders})', list(names))
+    values = dict.fromkeys(names, 0)
+    values.update((row[0], row[1]) for row in cursor.fetchall())
+    return values
+
+
+def check_counters(conn, fix=False):
+    """Recompute every counter from the base tables and report drift.
+
+    Returns a list of (name, stored, actual) for counters that disagree.
+    With fix=True the stored values are replaced in the same transaction.
+    """
+    cursor = conn.cursor()
+    cursor.execute(EXPECTED_COUNTERS_SQL)
+    expected = {row[0]: row[1] for row in cursor.fetchall()}
+    cursor.execute('SELECT name, value FROM stats_counters')
+    stored = {row[0]: row[1] for row in cursor.fetchall()}
+
+    drift = []
+    for name in sorted(set(expected) | set(stored)):
+        actual = expected.get(name, 0)
+        if stored.get(name, 0) != actual:
+            drift.append((name, stored.get(name, 0), actual))
+
+    if fix and drift:
+        cursor.executemany('''
+            INSERT INTO stats_counters (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        ''', [(name, actual) for name, _, actual in drift])
+        conn.commit()
+    return drift
+
+
+def rebuild_roster(conn):
+    """Recompute doctor_patients from appointments, e.g. after a bulk load without triggers.
+
+    Archived appointments count too when the archive is attached (archive.py).
+    """
+    source = archive.ALL_APPOINTMENTS if archive.is_attached(conn) else 'appointments'
+    with conn:
+        conn.execute('DELETE FROM doctor_patients')
+        conn.execute(f'''
+            INSERT INTO doctor_patients (doctor_id, patient_id, first_visit, last_visit, visits)
+            SELECT doctor_id, patient_id, MIN(appointment_date), MAX(appointment_date), COUNT(*)
+            FROM {source} GROUP BY doctor_id, patient_id
+        ''')
@@ -0,0 +1,94 @@
+"""Shared fixtures: the app module, on a fresh database built by init_db."""
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope='session')
+def hms(tmp_path_factory):
+    # app.py reads these at import time
+    os.environ['HMS_DATABASE'] = str(tmp_path_factory.mktemp('db') / 'hospital.db')
+    os.environ['HMS_DB_STARTUP'] = 'off'
+    import app
+    app.init_db(force=True)
+    return app
+
+
+@pytest.fixture
+def db(hms):
+    """A read-write connection to the test database."""
+    from utils import connect
+    conn = connect(hms.app.config['DATABASE'])
+    yield conn
+    conn.close()
+
+
+def add_user(conn, role):
+    add_user.count += 1
+    with conn:
+        user_id = conn.execute('INSERT INTO users (username, password, role, fullname) VALUES (?, ?, ?, ?)',
+                               (f'test_{role}{add_user.count}', '-', role, f'Test {role} {add_user.count}')).lastrowid
+        if role == 'doctor':
+            return conn.execute('INSERT INTO doctors (user_id, specialization, department_id) VALUES (?, ?, ?)',
+                                (user_id, 'General', 1)).lastrowid
+        return conn.execute('INSERT INTO patients (user_id) VALUES (?)', (user_id,)).lastrowid
+
+add_user.count = 0
+
+
+@pytest.fixture
+def new_doctor(db):
+    """Factory for doctors; returns the doctors.id."""
+    return lambda: add_user(db, 'doctor')
+
+
+@pytest.fixture
+def new_patient(db):
+    """Factory for patients; returns the patients.id."""
+    return lambda: add_user(db, 'patient')
+
+
+@pytest.fixture
+def admin_client(hms):
+    """A test client logged in as the seeded admin."""
+    client = hms.app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123', 'user_type': 'staff'})
+    return client
+
+
+@pytest.fixture
+def add_visit(db):
+    """Factory for appointments, with a treatment unless treatment=None.
+
+    Returns (appointment id, treatment id or None).
+    """
+    def add(patient_id, doctor_id, day, time='09:00', status='Completed', treatment='Checkup'):
+        with db:
+            appointment_id = db.execute('''
+                INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (patient_id, doctor_id, str(day), time, status)).lastrowid
+            if treatment is None:
+                return appointment_id, None
+            treatment_id = db.execute('''
+                INSERT INTO treatments (appointment_id, visit_type, diagnosis) VALUES (?, ?, ?)
+            ''', (appointment_id, treatment, f'Diagnosis {appointment_id}')).lastrowid
+        return appointment_id, treatment_id
+    return add
+
+
+@pytest.fixture
+def client_as(hms, db):
+    """Factory for test clients logged in as a patient or doctor, by profile id."""
+    def login(role, profile_id):
+        user_id = db.execute(f'SELECT user_id FROM {role}s WHERE id = ?', (profile_id,)).fetchone()[0]
+        client = hms.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return login
@@ -0,0 +1,101 @@
+"""Archiving: old finished appointments are copied, verified, then deleted from the hot tables."""
+import sqlite3
+from datetime import date
+
+import pytest
+
+# Older than anything the other tests create, so only these rows are archivable
+CUTOFF = date(2002, 1, 1)
+
+
+@pytest.fixture
+def archived(hms, tmp_path):
+    """A connection with an archive file attached, as `flask db archive` opens it."""
+    from utils import connect
+    conn = connect(hms.app.config['DATABASE'], archive_database=str(tmp_path / 'archive.db'))
+    yield conn
+    conn.close()
+
+
+def rows(conn, table, ids):
+    marks = ', '.join('?' * len(ids))
+    key = 'appointment_id' if table.endswith('treatments') else 'id'
+    return [tuple(row) for row in conn.execute(f'SELECT * FROM {table} WHERE {key} IN ({marks}) ORDER BY id', ids)]
+
+
+def roster(conn, doctor_id, patient_id):
+    return tuple(conn.execute('SELECT * FROM doctor_patients WHERE doctor_id = ? AND patient_id = ?',
+                              (doctor_id, patient_id)).fetchone())
+
+
+def test_archive_moves_old_visits_and_keeps_the_roster(archived, new_doctor, new_patient, add_visit):
+    from archive import archive_before
+    doctor_id, patient_id = new_doctor(), new_patient()
+    old = [add_visit(patient_id, doctor_id, date(2000, month, 1), status=status)[0]
+           for month, status in ((1, 'Completed'), (2, 'Cancelled'), (3, 'Completed'))]
+    booked, _ = add_visit(patient_id, doctor_id, date(2000, 4, 1), status='Booked', treatment=None)
+    recent, _ = add_visit(patient_id, doctor_id, date.today())
+    appointments, treatments = rows(archived, 'main.appointments', old), rows(archived, 'main.treatments', old)
+    before = roster(archived, doctor_id, patient_id)
+    history = archived.execute('SELECT COUNT(*) FROM history_summary WHERE patient_id = ?', (patient_id,)).fetchone()
+
+    totals = archive_before(archived, CUTOFF, batch_size=2)
+
+    assert (totals['appointments'], totals['treatments'], totals['batches']) == (3, 3, 2)
+    assert rows(archived, 'main.appointments', old) == []
+    assert rows(archived, 'main.treatments', old) == []
+    assert rows(archived, 'archive.appointments', old) == appointments
+    assert rows(archived, 'archive.treatments', old) == treatments
+    # Booked appointments and recent visits stay hot
+    assert len(rows(archived, 'main.appointments', [booked, recent])) == 2
+    assert roster(archived, doctor_id, patient_id) == before
+    assert archived.execute('SELECT COUNT(*) FROM history_summary WHERE patient_id = ?',
+                            (patient_id,)).fetchone() == history
+
+
+class EditBeforeVerify(sqlite3.Cursor):
+    """Edits the archived copy of `victim` just before the delete step verifies it."""
+
+    victim = None
+
+    def execute(self, sql, parameters=()):
+        from archive import VERIFIED_SQL
+        if sql is VERIFIED_SQL and self.victim is not None:
+            super().execute("UPDATE archive.appointments SET notes = 'edited' WHERE id = ?", (self.victim,))
+        return super().execute(sql, parameters)
+
+
+class EditingConnection(sqlite3.Connection):
+    def cursor(self, factory=EditBeforeVerify):
+        return super().cursor(factory)
+
+
+def test_rows_whose_copy_differs_are_not_deleted(hms, tmp_path, new_doctor, new_patient, add_visit):
+    from archive import archive_before
+    from utils import connect
+    conn = connect(hms.app.config['DATABASE'], factory=EditingConnection,
+                   archive_database=str(tmp_path / 'archive.db'))
+    doctor_id, patient_id = new_doctor(), new_patient()
+    kept, _ = add_visit(patient_id, doctor_id, date(2001, 5, 1))
+    moved, _ = add_visit(patient_id, doctor_id, date(2001, 6, 1))
+    before = roster(conn, doctor_id, patient_id)
+
+    EditBeforeVerify.victim = kept
+    try:
+        totals = archive_before(conn, CUTOFF)
+    finally:
+        EditBeforeVerify.victim = None
+
+    assert totals['appointments'] == 1
+    assert len(rows(conn, 'main.appointments', [kept])) == 1
+    assert rows(conn, 'main.appointments', [moved]) == []
+    assert roster(conn, doctor_id, patient_id) == before
+    # The stale copy is hidden while the row is hot, so the visit is listed once
+    assert conn.execute('SELECT COUNT(*) FROM history_summary WHERE patient_id = ?',
+                        (patient_id,)).fetchone()[0] == 2
+
+    # The next run refreshes the copy and finishes the move
+    assert archive_before(conn, CUTOFF)['appointments'] == 1
+    assert rows(conn, 'main.appointments', [kept]) == []
+    assert roster(conn, doctor_id, patient_id) == before
+    conn.close()
@@ -0,0 +1,54 @@
+"""Booking is an atomic reservation: concurrent requests for one slot book it once."""
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+SLOTS = [f'{hour:02d}:{minute:02d}' for hour in (9, 10, 11) for minute in (0, 30)]
+
+
+def race(app, patients, doctor_id, day, time):
+    """Book one slot from one thread per patient, released together; returns their results."""
+    from routes.patient_routes import book_appointment
+    barrier = threading.Barrier(len(patients))
+    results = [None] * len(patients)
+
+    def book(index):
+        # A request context of its own, as a concurrent POST would have
+        with app.test_request_context(method='POST'):
+            barrier.wait()
+            results[index] = book_appointment(patients[index], doctor_id, day, time)
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(len(patients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize('write_queue', [True, False], ids=['writer', 'request_connection'])
+def test_concurrent_bookings_book_a_slot_once(hms, db, new_doctor, new_patient, monkeypatch, write_queue):
+    if not write_queue:
+        monkeypatch.delitem(hms.app.extensions, 'db_writer')
+    doctor_id = new_doctor()
+    patients = [new_patient() for _ in range(4)]
+    day = (date.today() + timedelta(days=1)).isoformat()
+    for time in SLOTS:
+        assert sorted(race(hms.app, patients, doctor_id, day, time)) == [False, False, False, True]
+
+    booked = db.execute('''
+        SELECT appointment_time, COUNT(*) FROM appointments
+        WHERE doctor_id = ? AND appointment_date = ? AND status = 'Booked'
+        GROUP BY appointment_time
+    ''', (doctor_id, day)).fetchall()
+    assert {time: count for time, count in booked} == dict.fromkeys(SLOTS, 1)
+
+
+def test_other_integrity_errors_are_raised(hms, new_doctor):
+    from routes.patient_routes import book_appointment
+    day = (date.today() + timedelta(days=1)).isoformat()
+    with hms.app.test_request_context(method='POST'):
+        with pytest.raises(sqlite3.IntegrityError, match='NOT NULL'):
+            book_appointment(None, new_doctor(), day, '09:00')
@@ -0,0 +1,62 @@
+"""Expiring missed bookings, in batches, from one sweeper per database."""
+from datetime import date
+
+import pytest
+from flask import Flask
+
+CUTOFF = date(2004, 1, 1)
+
+
+def statuses(db, ids):
+    return [db.execute('SELECT status FROM appointments WHERE id = ?', (i,)).fetchone()[0] for i in ids]
+
+
+def test_expire_before_updates_in_batches(db, new_doctor, new_patient, add_visit):
+    from expiry import expire_before
+    doctor_id, patient_id = new_doctor(), new_patient()
+    backlog = db.execute("SELECT COUNT(*) FROM appointments WHERE status = 'Booked' AND appointment_date < ?",
+                         (CUTOFF.isoformat(),)).fetchone()[0]
+    missed = [add_visit(patient_id, doctor_id, date(2003, 6, day), status='Booked', treatment=None)[0]
+              for day in range(1, 6)]
+    completed, _ = add_visit(patient_id, doctor_id, date(2003, 7, 1))
+    on_cutoff, _ = add_visit(patient_id, doctor_id, CUTOFF, status='Booked', treatment=None)
+
+    totals = expire_before(db, CUTOFF, batch_size=2)
+
+    assert totals['appointments'] == backlog + 5
+    assert totals['batches'] == (backlog + 5 + 1) // 2
+    assert statuses(db, missed) == ['Expired'] * 5
+    # Only Booked appointments dated strictly before the cutoff change
+    assert statuses(db, [completed, on_cutoff]) == ['Completed', 'Booked']
+    assert expire_before(db, CUTOFF, batch_size=2)['appointments'] == 0
+
+
+def test_only_one_sweeper_holds_the_lock(tmp_path):
+    from expiry import Sweeper, fcntl
+    if fcntl is None:
+        pytest.skip('no fcntl: every process sweeps')
+    lock_path = str(tmp_path / 'hospital.db.sweeper.lock')
+    first = Sweeper('unused.db', 60, lock_path=lock_path)
+    second = Sweeper('unused.db', 60, lock_path=lock_path)
+    assert first.holds_lock()
+    assert not second.holds_lock()
+    assert first.holds_lock()
+    # The lock is released when its holder goes away, and another sweeper takes over
+    first._lock_file.close()
+    assert second.holds_lock()
+    second._lock_file.close()
+
+
+def test_sweeper_starts_with_the_first_request(hms):
+    import expiry
+    app = Flask(__name__)
+    app.config.update(DATABASE=hms.app.config['DATABASE'], EXPIRE_INTERVAL_SECONDS=3600)
+    expiry.init_app(app)
+    sweeper = app.extensions['expiry_sweeper']
+    assert sweeper._thread is None
+    app.test_client().get('/')
+    assert sweeper._thread.is_alive()
+    sweeper.stop(timeout=5)
+    assert not sweeper._thread.is_alive()
+    assert sweeper.run_once() is not None
+    assert sweeper.stats()['runs'] == 1
@@ -0,0 +1,52 @@
+"""Paginated treatment history: summary pages newest first, details on demand."""
+import re
+from datetime import date, timedelta
+
+
+def page_through(client, url, limit):
+    """Treatment ids from every page of a history JSON endpoint, and the page count."""
+    ids, after, pages = [], None, 0
+    while True:
+        query = {'limit': limit, **({'after': after} if after else {})}
+        page = client.get(url, query_string=query).get_json()
+        ids += [int(i) for i in re.findall(r'/treatment/(\d+)', page['html'])]
+        pages += 1
+        after = page['next']
+        if after is None:
+            return ids, pages
+
+
+def test_pages_cover_the_history_newest_first(hms, new_doctor, new_patient, add_visit, client_as):
+    doctors = [new_doctor(), new_doctor()]
+    patient_id = new_patient()
+    other_patient = new_patient()
+    today = date.today()
+    visits = []
+    for i in range(7):
+        # Two visits share a date: the cursor breaks the tie on created_at and id
+        day = today - timedelta(days=30 * (i // 2 + 1))
+        visits.append((day, add_visit(patient_id, doctors[i % 2], day)[1], doctors[i % 2]))
+    add_visit(other_patient, doctors[0], today - timedelta(days=10))
+    newest_first = [treatment_id for _, treatment_id, _ in sorted(visits, key=lambda v: (v[0], v[1]), reverse=True)]
+
+    ids, pages = page_through(client_as('patient', patient_id), '/patient/history/page', 3)
+    assert ids == newest_first
+    assert pages == 3
+
+    # A doctor's view of the patient only lists that doctor's visits
+    doctor_id = doctors[0]
+    expected = [t for t in newest_first if any(v[1] == t and v[2] == doctor_id for v in visits)]
+    ids, _ = page_through(client_as('doctor', doctor_id), f'/doctor/patient/{patient_id}/history/page', 2)
+    assert ids == expected
+
+
+def test_treatment_details_are_only_served_to_their_patient(hms, new_doctor, new_patient, add_visit, client_as):
+    doctor_id = new_doctor()
+    patient_id = new_patient()
+    _, treatment_id = add_visit(patient_id, doctor_id, date.today() - timedelta(days=3))
+
+    details = client_as('patient', patient_id).get(f'/patient/treatment/{treatment_id}').get_json()
+    assert details['id'] == treatment_id
+    assert details['diagnosis'].startswith('Diagnosis')
+
+    assert client_as('patient', new_patient()).get(f'/patient/treatment/{treatment_id}').status_code == 404
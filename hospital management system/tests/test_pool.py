@@ -0,0 +1,64 @@
+"""Connection pools: one pooled connection per request, reused across requests."""
+import sqlite3
+
+import pytest
+
+
+def test_released_connection_is_reused(hms):
+    from utils import ConnectionPool
+    pool = ConnectionPool(hms.app.config['DATABASE'], size=2)
+    conn = pool.acquire()
+    # Route handlers still call close(); the connection must survive it
+    conn.close()
+    conn.execute('SELECT 1')
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats()['open'] == 1
+    assert pool.stats()['acquired'] == 2
+    pool.release(conn)
+    pool.close_all()
+    assert pool.stats()['open'] == 0
+
+
+def test_release_rolls_back_an_open_transaction(hms, db):
+    from utils import ConnectionPool
+    pool = ConnectionPool(hms.app.config['DATABASE'], size=1)
+    conn = pool.acquire()
+    conn.execute("INSERT INTO app_meta (key, value) VALUES ('test_pool', 1)")
+    pool.release(conn)
+    assert not conn.in_transaction
+    assert db.execute("SELECT 1 FROM app_meta WHERE key = 'test_pool'").fetchone() is None
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out(hms):
+    from utils import ConnectionPool, PoolTimeout
+    pool = ConnectionPool(hms.app.config['DATABASE'], size=1, timeout=0.01)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['waits'] == 1
+    pool.release(conn)
+    pool.close_all()
+
+
+def test_request_shares_one_connection_and_returns_it(hms):
+    from utils import get_db_connection
+    pool = hms.app.extensions['db_pool']
+    with hms.app.test_request_context(method='POST'):
+        conn = get_db_connection()
+        assert get_db_connection() is conn
+        assert pool.stats()['in_use'] == 1
+    # Released at teardown, then handed to the next request
+    assert pool.stats()['in_use'] == 0
+    with hms.app.test_request_context(method='POST'):
+        assert get_db_connection() is conn
+
+
+def test_read_only_connections_reject_writes(hms):
+    from utils import get_db_connection
+    with hms.app.test_request_context(method='GET'):
+        conn = get_db_connection()
+        assert conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] >= 1
+        with pytest.raises(sqlite3.OperationalError, match='readonly|read-only'):
+            conn.execute("INSERT INTO app_meta (key, value) VALUES ('test_read_only', 1)")
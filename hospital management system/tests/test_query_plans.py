@@ -0,0 +1,77 @@
+"""EXPLAIN QUERY PLAN checks for the hot-path indexes (migrations 1 and 8).
+
+Each test runs the app's own query functions on a fresh database built by
+init_db, records the statements they send, and checks that SQLite answers
+them from the expected index instead of scanning appointments.
+
+    python -m pytest tests
+"""
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def traced(hms):
+    """A connection to the fresh database and the list of statements run on it."""
+    from utils import connect
+    conn = connect(hms.app.config['DATABASE'])
+    statements = []
+    # Statements arrive with their parameters inlined, ready to EXPLAIN
+    conn.set_trace_callback(statements.append)
+    yield conn, statements
+    conn.close()
+
+
+def plans(conn, statements):
+    """EXPLAIN QUERY PLAN detail lines of each SELECT that reads appointments."""
+    conn.set_trace_callback(None)
+    return [[row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+            for sql in statements
+            if sql.lstrip().upper().startswith('SELECT') and 'appointments' in sql]
+
+
+def assert_indexed(plan, index):
+    assert any(f'USING INDEX {index}' in step or f'USING COVERING INDEX {index}' in step for step in plan), plan
+    assert not any(step.startswith(('SCAN a', 'SCAN appointments')) for step in plan), plan
+
+
+def test_admin_dashboard_lists_use_status_index(hms, traced):
+    conn, statements = traced
+    from routes.admin_routes import fetch_upcoming_appointments, fetch_past_appointments
+    fetch_upcoming_appointments(conn.cursor())
+    fetch_past_appointments(conn.cursor(), after=['2025-01-01', '09:00', 10])
+    found = plans(conn, statements)
+    assert len(found) == 4
+    for plan in found:
+        assert_indexed(plan, 'idx_appointments_status_date')
+
+
+def test_availability_uses_doctor_status_index(hms, traced):
+    conn, statements = traced
+    from slots import get_free_slots
+    get_free_slots(conn.cursor(), 1, date.today())
+    (plan,) = plans(conn, statements)
+    assert_indexed(plan, 'idx_appointments_doctor_status_date')
+
+
+def test_patient_dashboard_uses_patient_status_index(hms, traced):
+    conn, statements = traced
+    from repository import upcoming_for_patient
+    upcoming_for_patient(conn.cursor(), 1)
+    (plan,) = plans(conn, statements)
+    assert_indexed(plan, 'idx_appointments_patient_status_date')
+
+
+@pytest.mark.parametrize('doctor_id', [None, 1])
+def test_history_uses_patient_date_index(hms, traced, doctor_id):
+    conn, statements = traced
+    from history import HOT_HISTORY, query_history
+    after = [(date.today() - timedelta(days=30)).isoformat(), '2025-01-01 10:00:00', 5]
+    query_history(conn.cursor(), HOT_HISTORY, 1, None, 21, doctor_id)
+    query_history(conn.cursor(), HOT_HISTORY, 1, after, 21, doctor_id)
+    found = plans(conn, statements)
+    assert len(found) == 2
+    for plan in found:
+        assert_indexed(plan, 'idx_appointments_patient_date')
+        assert any('idx_treatments_summary' in step for step in plan), plan
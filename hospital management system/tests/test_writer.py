@@ -0,0 +1,106 @@
+"""The writer thread: group commit, with each unit in its own savepoint."""
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def writer(hms):
+    from writer import Writer
+    # A wide window, so units submitted together share one transaction
+    return Writer(hms.app.config['DATABASE'], window=0.5)
+
+
+def insert(key):
+    def unit(cursor):
+        cursor.execute('INSERT INTO app_meta (key, value) VALUES (?, 1)', (key,))
+        return key
+    return unit
+
+
+def insert_then_fail(key):
+    def unit(cursor):
+        cursor.execute('INSERT INTO app_meta (key, value) VALUES (?, 1)', (key,))
+        raise ValueError('unit failed')
+    return unit
+
+
+def submit_together(writer, units):
+    """Submit units from one thread each, released together; returns results or exceptions."""
+    barrier = threading.Barrier(len(units))
+    outcomes = [None] * len(units)
+
+    def submit(index):
+        barrier.wait()
+        try:
+            outcomes[index] = writer.submit(units[index])
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(units))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def keys(db, prefix):
+    return {row[0] for row in db.execute('SELECT key FROM app_meta WHERE key LIKE ?', (prefix + '%',))}
+
+
+def test_failed_unit_is_rolled_back_alone(writer, db):
+    units = [insert('writer_a'), insert_then_fail('writer_b'), insert('writer_c'),
+             insert('writer_a')]  # a duplicate key: a SQLite error inside the unit
+    outcomes = submit_together(writer, units)
+
+    assert writer.stats()['batches'] == 1
+    assert writer.stats()['units'] == 4
+    assert isinstance(outcomes[1], ValueError)
+    successes = [o for o in outcomes if isinstance(o, tuple)]
+    failures = [o for o in outcomes if isinstance(o, sqlite3.IntegrityError)]
+    # Whichever writer_a insert ran first won; the other was rolled back to its savepoint
+    assert sorted(result for result, _ in successes) == ['writer_a', 'writer_c']
+    assert len(failures) == 1
+    assert keys(db, 'writer_') == {'writer_a', 'writer_c'}
+    # Each unit's own statements come back with its result
+    for _, (statements, sql_time, rows) in successes:
+        assert statements == 1
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_writer_thread_is_restarted(hms, db):
+    from writer import Writer
+    writer = Writer(hms.app.config['DATABASE'], window=0)
+
+    def kill(cursor):
+        # Not an Exception: nothing in the loop catches it, and the thread dies
+        raise SystemExit
+
+    writer.submit(insert('restart_a'))
+    with pytest.raises(RuntimeError, match='died'):
+        writer.submit(kill)
+    writer._thread.join(5)
+    assert not writer._thread.is_alive()
+    writer.submit(insert('restart_b'))
+    assert writer.stats()['restarts'] == 1
+    assert keys(db, 'restart_') == {'restart_a', 'restart_b'}
+
+
+def test_slow_unit_gets_writer_busy(hms, db):
+    from writer import Writer, WriterBusy
+    writer = Writer(hms.app.config['DATABASE'], window=0, result_timeout=0.05)
+    release = threading.Event()
+
+    def slow(cursor):
+        release.wait(5)
+        return insert('busy_a')(cursor)
+
+    with pytest.raises(WriterBusy):
+        writer.submit(slow)
+    assert writer.stats()['rejected'] == 1
+    release.set()
+    # The unit was still committed once it finished
+    writer.submit(insert('busy_b'))
+    assert keys(db, 'busy_') == {'busy_a', 'busy_b'}
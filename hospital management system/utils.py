@@ -1,13 +1,310 @@
 from functools import wraps
 from flask_login import login_required, current_user
-from flask import flash, redirect, url_for
+from flask import flash, redirect, url_for, g, current_app, has_app_context, has_request_context, request, abort
+from urllib.parse import quote
+import os
 import sqlite3
+import base64
+import json
+import threading
+import queue
+import time
+import slowlog
+import archive
 
-def get_db_connection():
-    conn = sqlite3.connect('hospital.db')
+# Connection settings applied once when a connection is opened
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',        # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',      # 256 MB memory-mapped I/O
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+)
+# journal_mode is the read-write side's to set
+READ_ONLY_PRAGMAS = PRAGMAS[1:]
+
+# Requests with these methods get a connection from the read-only pool
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that adds its statements, time and fetched rows to its connection's counters.
+
+    It also hands statements slower than slowlog.threshold to the slow-query log.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._statement = (sql, parameters, False)
+            self._track(time.perf_counter() - started, 1, 0, reset=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._statement = (sql, (), True)
+            self._track(time.perf_counter() - started, 1, 0, reset=True)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._track(time.perf_counter() - started, 0, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(time.perf_counter() - started, 0, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._track(time.perf_counter() - started, 0, len(rows))
+        return rows
+
+    def _track(self, elapsed, statements, rows, reset=False):
+        self.connection.account(elapsed, statements, rows)
+        if slowlog.threshold is None:
+            return
+        # Execute and fetch time of the current statement; logged once when it crosses the threshold
+        if reset:
+            self._elapsed, self._logged = 0.0, False
+        self._elapsed = getattr(self, '_elapsed', 0.0) + elapsed
+        if self._elapsed > slowlog.threshold and not getattr(self, '_logged', True):
+            self._logged = True
+            sql, parameters, many = self._statement
+            slowlog.record(self.connection, sql, parameters, self._elapsed, many)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection owned by a ConnectionPool.
+
+    Route handlers still call close() when they are done; for pooled
+    connections that is a no-op and the connection goes back to the pool
+    when the app context is torn down.
+
+    Statements run through it are counted (see InstrumentedCursor) since the
+    last reset_counters(), for the per-request metrics in metrics.py.
+    """
+
+    statements = 0
+    sql_time = 0.0
+    rows = 0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def account(self, elapsed, statements, rows):
+        self.sql_time += elapsed
+        self.statements += statements
+        self.rows += rows
+
+    def reset_counters(self):
+        self.statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+
+    def close(self):
+        pass
+
+    def _close(self):
+        super().close()
+
+
+def read_only_uri(database):
+    return f'file:{quote(os.path.abspath(database))}?mode=ro'
+
+
+def connect(database, factory=sqlite3.Connection, archive_database=None, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(read_only_uri(database), uri=True, factory=factory, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(database, factory=factory, check_same_thread=False)
+    for pragma in READ_ONLY_PRAGMAS if readonly else PRAGMAS:
+        conn.execute(pragma)
+    if archive_database:
+        archive.attach(conn, archive_database, readonly=readonly)
+    if readonly:
+        # After attach, which creates a temp view
+        conn.execute('PRAGMA query_only = 1')
     conn.row_factory = sqlite3.Row
     return conn
 
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, database, size=8, timeout=10.0, archive_database=None, readonly=False):
+        self.database = database
+        self.archive_database = archive_database
+        self.readonly = readonly
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = connect(self.database, factory=PooledConnection, archive_database=self.archive_database,
+                                   readonly=self.readonly)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                finally:
+                    waited = time.perf_counter() - started
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_time += waited
+                        self._max_wait = max(self._max_wait, waited)
+        with self._lock:
+            self._acquired += 1
+        conn.reset_counters()
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn._close()
+            with self._lock:
+                self._created -= 1
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn._close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': idle,
+                'in_use': self._created - idle,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'wait_time_total': self._wait_time,
+                'wait_time_max': self._max_wait,
+            }
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', 'hospital.db')
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10.0)
+    app.config.setdefault('DB_READ_POOL_SIZE', 8)
+    app.config.setdefault('ARCHIVE_DATABASE', None)
+    app.extensions['db_pool'] = ConnectionPool(app.config['DATABASE'],
+                                               size=app.config['DB_POOL_SIZE'],
+                                               timeout=app.config['DB_POOL_TIMEOUT'],
+                                               archive_database=app.config['ARCHIVE_DATABASE'])
+    # Read-only lane for GET requests; size 0 sends them to the read-write pool
+    if app.config['DB_READ_POOL_SIZE']:
+        app.extensions['db_read_pool'] = ConnectionPool(app.config['DATABASE'],
+                                                        size=app.config['DB_READ_POOL_SIZE'],
+                                                        timeout=app.config['DB_POOL_TIMEOUT'],
+                                                        archive_database=app.config['ARCHIVE_DATABASE'],
+                                                        readonly=True)
+    app.teardown_appcontext(close_db)
+
+
+def get_pool(readonly=False):
+    if readonly:
+        return current_app.extensions.get('db_read_pool') or current_app.extensions['db_pool']
+    return current_app.extensions['db_pool']
+
+
+def get_db_connection():
+    # Outside a request (scripts, CLI) hand out a private connection
+    if not has_app_context() or 'db_pool' not in current_app.extensions:
+        database = current_app.config.get('DATABASE', 'hospital.db') if has_app_context() else 'hospital.db'
+        return connect(database)
+
+    # One pooled connection per request, shared by the user loader and the view;
+    # read-only for GETs, whose writes would go through writer.py anyway
+    if 'db' not in g:
+        g.db_pool = get_pool(readonly=has_request_context() and request.method in READ_METHODS)
+        g.db = g.db_pool.acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        g.pop('db_pool').release(conn)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token, size):
+    # A tampered or stale cursor is a client error, not a server one
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        abort(400)
+    if not isinstance(values, list) or len(values) != size:
+        abort(400)
+    # Only values sqlite3 can bind; bool is an int subclass but never in a key
+    if not all(value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+               for value in values):
+        abort(400)
+    return values
+
+
+def keyset_page(rows, limit, key):
+    """Split a LIMIT limit+1 result into the page and the cursor for the next one."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
 def role_required(*roles):
     def decorator(f):
         @wraps(f)
@@ -19,4 +316,3 @@ def role_required(*roles):
             return f(*args, **kwargs)
         return decorated_function
     return decorator
-
@@ -0,0 +1,239 @@
+import logging
+import queue
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from flask import current_app
+
+from metrics import WRITER_BATCH_BUCKETS, record_write
+from utils import connect, get_db_connection, PooledConnection
+
+# Every route write goes through one writer thread that owns the only write
+# connection. A write unit is a function of a cursor; the route blocks on its
+# future until the transaction holding it has committed. Units that arrive
+# within WRITE_BATCH_WINDOW_MS of each other share one transaction and one
+# WAL sync (group commit). Each unit runs inside its own SAVEPOINT, so a
+# unit that raises is rolled back alone and its exception is re-raised in
+# the route that submitted it. Units must not touch the request or
+# current_user: they run on the writer thread. The queue is bounded; when it
+# stays full for WRITE_QUEUE_TIMEOUT, submit raises WriterBusy (HTTP 503), as
+# it does when a queued unit has not committed after WRITE_RESULT_TIMEOUT.
+# Each unit's statements, SQL time and rows come back with its result, so
+# the per-endpoint metrics count them against the route that submitted it.
+#
+# Deliberate exceptions, which take BEGIN IMMEDIATE on their own connections:
+# the `flask db` commands (archive, expire-bookings, import-users, ...) run
+# outside any server process, and the optional expiry sweeper (expiry.py)
+# writes in short batches between requests. busy_timeout makes either side
+# wait for the other rather than fail.
+
+logger = logging.getLogger('hms.writer')
+
+
+class WriterBusy(Exception):
+    """The write queue stayed full, or a unit's result did not arrive in time."""
+
+
+class Writer:
+    def __init__(self, database, size=256, window=0.002, max_batch=64, timeout=5.0, result_timeout=60.0):
+        self.database = database
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.result_timeout = result_timeout
+        self._queue = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._thread = None
+        # Written by the writer thread only, except rejected and restarts (under _lock)
+        self.units = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.restarts = 0
+        self.batch_buckets = [0] * (len(WRITER_BATCH_BUCKETS) + 1)
+        self.max_depth = 0
+        self.wait_time = 0.0
+        self.commit_time = 0.0
+
+    def submit(self, fn):
+        """Run fn(cursor) in the next write transaction.
+
+        Returns (result, (statements, sql_time, rows)) for the unit.
+        """
+        self._start()
+        future = Future()
+        try:
+            self._queue.put((fn, future, time.perf_counter()), timeout=self.timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise WriterBusy(f'Write queue full for {self.timeout}s')
+        # Long enough for any healthy backlog; past it the request gets a 503
+        # rather than holding its thread forever. The unit may still commit.
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.rejected += 1
+            raise WriterBusy(f'Write not committed after {self.result_timeout}s')
+
+    def _start(self):
+        # Started on first use, so a pre-forking server gets one writer per worker;
+        # started again if the thread ever died
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    if self._thread is not None:
+                        self.restarts += 1
+                    self._thread = threading.Thread(target=self._loop, name='hms-writer', daemon=True)
+                    self._thread.start()
+
+    def _connect(self):
+        # PooledConnection counts each unit's statements for record_write
+        conn = connect(self.database, factory=PooledConnection)
+        conn.isolation_level = None  # transactions are managed explicitly below
+        return conn
+
+    def _loop(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            self.max_depth = max(self.max_depth, self._queue.qsize() + 1)
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._run(conn, batch)
+            except Exception as e:
+                # Could not connect, or could not even roll back: fail this batch
+                # and start the next one on a fresh connection
+                logger.exception('Write batch failed')
+                self._fail([(future, None) for _, future, _ in batch], e)
+                if conn is not None:
+                    try:
+                        conn._close()
+                    except Exception:
+                        pass
+                    conn = None
+                time.sleep(self.window)
+            except BaseException:
+                # The thread is dying (a unit raised SystemExit, say): fail the
+                # batch and release the write lock now, not when conn is collected
+                self._fail([(future, None) for _, future, _ in batch], RuntimeError('Writer thread died'))
+                if conn is not None:
+                    conn._close()
+                raise
+
+    def _run(self, conn, batch):
+        started = time.perf_counter()
+        self.batches += 1
+        self.batch_buckets[bisect_left(WRITER_BATCH_BUCKETS, len(batch))] += 1
+        cursor = conn.cursor()
+        done = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for fn, future, queued in batch:
+                self.units += 1
+                self.wait_time += started - queued
+                cursor.execute('SAVEPOINT unit')
+                conn.reset_counters()
+                try:
+                    result = (fn(cursor), (conn.statements, conn.sql_time, conn.rows))
+                except Exception as e:
+                    self.failed += 1
+                    future.set_exception(e)
+                    if conn.in_transaction:
+                        cursor.execute('ROLLBACK TO unit')
+                        cursor.execute('RELEASE unit')
+                    else:
+                        # SQLite abandoned the whole transaction (e.g. disk full); the
+                        # units already run went with it
+                        self._fail(done, e)
+                        done = []
+                        cursor.execute('BEGIN IMMEDIATE')
+                else:
+                    cursor.execute('RELEASE unit')
+                    done.append((future, result))
+            cursor.execute('COMMIT')
+        except Exception as e:
+            self._fail([(future, None) for _, future, _ in batch], e)
+            if conn.in_transaction:
+                conn.rollback()
+        else:
+            for future, result in done:
+                future.set_result(result)
+        self.commit_time += time.perf_counter() - started
+
+    def _fail(self, done, error):
+        for future, _ in done:
+            if not future.done():
+                self.failed += 1
+                future.set_exception(error)
+
+    def stats(self):
+        return {
+            'depth': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'units': self.units,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'restarts': self.restarts,
+            'batch_buckets': list(self.batch_buckets),
+            'wait_time_total': round(self.wait_time, 6),
+            'transaction_time_total': round(self.commit_time, 6),
+        }
+
+
+def write(fn):
+    """Run fn(cursor) as one write unit and return its result.
+
+    Without a writer (WRITE_QUEUE off) the unit runs in its own transaction
+    on the request's connection.
+    """
+    writer = current_app.extensions.get('db_writer')
+    if writer is not None:
+        result, counters = writer.submit(fn)
+        record_write(*counters)
+        return result
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def busy(error):
+    return 'The server is busy. Please try again.', 503, {'Retry-After': '1'}
+
+
+def init_app(app):
+    app.config.setdefault('WRITE_QUEUE', True)
+    app.config.setdefault('WRITE_QUEUE_SIZE', 256)
+    app.config.setdefault('WRITE_QUEUE_TIMEOUT', 5.0)
+    app.config.setdefault('WRITE_RESULT_TIMEOUT', 60.0)
+    app.config.setdefault('WRITE_BATCH_WINDOW_MS', 2)
+    app.config.setdefault('WRITE_BATCH_MAX', 64)
+    app.register_error_handler(WriterBusy, busy)
+    if app.config['WRITE_QUEUE']:
+        app.extensions['db_writer'] = Writer(app.config['DATABASE'],
+                                             size=app.config['WRITE_QUEUE_SIZE'],
+                                             window=app.config['WRITE_BATCH_WINDOW_MS'] / 1000,
+                                             max_batch=app.config['WRITE_BATCH_MAX'],
+                                             timeout=app.config['WRITE_QUEUE_TIMEOUT'],
+                                             result_timeout=app.config['WRITE_RESULT_TIMEOUT'])